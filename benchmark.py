@@ -0,0 +1,230 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-07-02 14:21:09
+# Description: 在参数化的合成地图上测量激光雷达, 栅格化和规划器的耗时与内存, 结果写为 JSON
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import shapely
+
+from plan_planning_env import Map, RRT, WaveFront
+from plan_planning_env.env import Lidar
+
+
+def synthetic_map(num_obstacles, num_vertices, extent, seed=0):
+    """ 随机生成 num_obstacles 个 num_vertices 边的星形多边形, 起终点位于对角且周围留空.
+        Args:
+            extent (float): 地图范围为 [-extent, extent]^2.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.array([-0.9 * extent, -0.9 * extent])
+    end = np.array([0.9 * extent, 0.9 * extent])
+    obstacles = []
+    while len(obstacles) < num_obstacles:
+        radius = rng.uniform(0.02, 0.08) * extent
+        center = rng.uniform(-extent + radius, extent - radius, 2)
+        if min(np.linalg.norm(center - start), np.linalg.norm(center - end)) < radius + 0.1 * extent:
+            continue
+        # 角度间隔小于 pi, 保证星形多边形不自相交
+        angles = (np.arange(num_vertices) + rng.uniform(-0.25, 0.25, num_vertices)) * 2 * np.pi / num_vertices
+        radii = radius * rng.uniform(0.5, 1.0, num_vertices)
+        obstacles.append((center + np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1)).tolist())
+    return Map(obstacles, start=start.tolist(), end=end.tolist(), map_size=[[-extent, -extent], [extent, extent]])
+
+
+def measure(fn, setup=None, repeat=10, warmup=1):
+    """ 每次调用前执行 setup() (不计时), 返回耗时统计和一次单独运行的 tracemalloc 峰值. """
+    setup = setup or (lambda: None)
+    for _ in range(warmup):
+        fn(setup())
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        t = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t)
+    # tracemalloc 会拖慢执行, 峰值内存单独测一次
+    arg = setup()
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = np.asarray(times)
+    return {
+        "n": len(times),
+        "mean_s": float(times.mean()),
+        "min_s": float(times.min()),
+        "p50_s": float(np.percentile(times, 50)),
+        "p90_s": float(np.percentile(times, 90)),
+        "p99_s": float(np.percentile(times, 99)),
+        "throughput_per_s": float(1.0 / times.mean()),
+        "peak_bytes": int(peak),
+    }
+
+
+def lidar_accuracy(m, lidar, num_poses=32, seed=0):
+    """ 与逐条射线求交的 shapely 参考实现比较测距结果. 距离误差只统计两者都命中的射线. """
+    rng = np.random.default_rng(seed)
+    reference = Lidar(m, lidar.max_range, lidar.scan_angle, lidar.num_angle, backend='shapely')
+    errors, agree = [], []
+    for x, y, yaw in np.c_[rng.uniform(m.size[0], m.size[1], (num_poses, 2)), rng.uniform(-np.pi, np.pi, num_poses)]:
+        for l in (lidar, reference):
+            l.x, l.y, l.yaw = x, y, yaw
+        ranges, hit = (a.copy() for a in lidar.observe())
+        ref_ranges, ref_hit = reference.observe()
+        errors.append(np.abs(ranges - ref_ranges)[hit & ref_hit])
+        agree.append(np.mean(hit == ref_hit))
+    errors = np.concatenate(errors) if errors else np.zeros(0)
+    if len(errors) == 0:
+        errors = np.zeros(1)
+    return {
+        "mean_abs_err": float(errors.mean()),
+        "p99_abs_err": float(np.percentile(errors, 99)),
+        "max_abs_err": float(errors.max()),
+        "hit_agreement": float(np.mean(agree)),
+    }
+
+
+def lidar_cases(m, repeat, grid_resolutions=(0.05,)):
+    rng = np.random.default_rng(0)
+    poses = rng.uniform(m.size[0], m.size[1], (64, 2))
+    lidars = [({"backend": "numpy"}, Lidar(m))]
+    lidars += [({"backend": "grid", "grid_resolution": res}, Lidar(m, backend='grid', grid_resolution=res))
+               for res in grid_resolutions]
+    for params, lidar in lidars:
+        counter = itertools.count()
+
+        def setup(lidar=lidar):
+            lidar.x, lidar.y = poses[next(counter) % len(poses)]
+            return lidar
+        stats = measure(lambda lidar: lidar.scan(), setup, repeat)
+        yield "lidar_scan", params, dict(stats, accuracy=lidar_accuracy(m, lidar))
+
+
+def grid_cases(m, resolution, repeat):
+    wf = WaveFront(m, grid_resolution=resolution)
+    yield "create_occupancy_grid", {"resolution": resolution}, measure(lambda wf: wf.create_occupancy_grid(), lambda: wf,
+                                                                        max(1, repeat // 5))
+
+    def fresh():
+        wf._field = None  # 不复用上一次的步数场
+        return wf
+    yield "wavefront_plan", {"resolution": resolution}, measure(lambda wf: wf.plan(), fresh, repeat)
+
+
+def rrt_cases(m, repeat):
+    np.random.seed(0)
+    yield "rrt_plan", {}, measure(lambda rrt: rrt.plan(), lambda: RRT(m), repeat)
+
+
+def predictor_cases(m, repeat):
+    try:
+        import torch
+        from plan_planning_env.lite import LiteLidarPathTransformer
+        from plan_planning_env.transformer import PathPredictor
+    except ImportError:
+        return
+    torch.manual_seed(0)
+    lidar = Lidar(m)
+    predictor = PathPredictor(LiteLidarPathTransformer(lidar.num_angle))
+
+    def scan(pos):
+        lidar.x, lidar.y = pos
+        return lidar.ranges()
+    yield "predictor_plan_path", {"max_steps": 50}, measure(
+        lambda p: p.plan_path(scan, m.start, m.end, max_steps=50), lambda: predictor, max(1, repeat // 5))
+
+
+def run(obstacles, vertices, extents, resolutions, repeat, benches):
+    results = []
+    for num_obstacles, num_vertices, extent in itertools.product(obstacles, vertices, extents):
+        m = synthetic_map(num_obstacles, num_vertices, extent)
+        params = {"obstacles": num_obstacles, "vertices": num_vertices, "extent": extent}
+        cases = []
+        if "lidar" in benches:
+            cases.append(lidar_cases(m, repeat, resolutions))
+        if "grid" in benches:
+            cases += [grid_cases(m, resolution, repeat) for resolution in resolutions]
+        if "rrt" in benches:
+            cases.append(rrt_cases(m, repeat))
+        if "predictor" in benches:
+            cases.append(predictor_cases(m, repeat))
+        for name, extra, stats in itertools.chain(*cases):
+            result = {"bench": name, "params": dict(params, **extra), **stats}
+            results.append(result)
+            print(f"{name:24s} {json.dumps(result['params']):70s} p50 {stats['p50_s'] * 1e3:9.3f} ms  "
+                  f"p99 {stats['p99_s'] * 1e3:9.3f} ms  peak {stats['peak_bytes'] / 2**20:7.2f} MiB")
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "shapely": shapely.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """ 与之前的 JSON 比较 p50, 变慢超过 threshold 倍的记为回归. """
+    with open(baseline_path) as f:
+        baseline = {(r["bench"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["bench"], json.dumps(r["params"], sort_keys=True)))
+        if old is None:
+            continue
+        ratio = r["p50_s"] / old["p50_s"]
+        if ratio > threshold:
+            regressions += 1
+            print(f"REGRESSION {r['bench']} {r['params']}: p50 {old['p50_s'] * 1e3:.3f} -> {r['p50_s'] * 1e3:.3f} ms "
+                  f"({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark lidar, grid building and planners on synthetic maps")
+    parser.add_argument("-o", "--output", default="bench.json", help="JSON output file")
+    parser.add_argument("--obstacles", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--vertices", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--extents", type=float, nargs="+", default=[10.0, 20.0], help="half size of the map (m)")
+    parser.add_argument("--resolutions", type=float, nargs="+", default=[0.1, 0.05])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--bench", nargs="+", default=["lidar", "grid", "rrt", "predictor"],
+                        choices=["lidar", "grid", "rrt", "predictor"])
+    parser.add_argument("--quick", action="store_true", help="one small map, few repeats")
+    parser.add_argument("--compare", default=None, help="baseline JSON, exit with status 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 slowdown ratio treated as a regression")
+    args = parser.parse_args()
+    if args.quick:
+        args.obstacles, args.vertices, args.extents, args.resolutions, args.repeat = [20], [6], [10.0], [0.1], 5
+
+    results = run(args.obstacles, args.vertices, args.extents, args.resolutions, args.repeat, args.bench)
+    with open(args.output, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2)
+    print(f"{len(results)} results written to {args.output}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,18 @@
 # Created on: 2025-06-06 15:38:42
 # Description:
 
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon
 from matplotlib.lines import Line2D
-from matplotlib.path import Path
 import tkinter as tk
 from tkinter import filedialog
 import os
 import pickle
 import random
+from plan_planning_env.dataset import PathDataset, load_maps
+from plan_planning_env.sampling import random_start_end
 
 plt.rcParams['toolbar'] = 'None'
 plt.rcParams['xtick.bottom'] = False
@@ -25,7 +27,7 @@ plt.rcParams['ytick.labelleft'] = False
 save_dir = os.getcwd()+"/dataset/trains/"
 
 class MapEditor:
-    def __init__(self):
+    def __init__(self, runs_per_map=20):
 
         # Initialize figure and axes
         self.fig, self.ax = plt.subplots(figsize=(10, 10))
@@ -65,6 +67,8 @@ class MapEditor:
         root.withdraw()
 
         self.copied_shape_vertices = None  # 新增：用于存储复制的图形
+        # 未指定起终点时保存地图随机生成的 run 个数
+        self.runs_per_map = runs_per_map
 
 
     # add event listeners
@@ -268,35 +272,17 @@ class MapEditor:
             self.temp_line.set_data([], [])
             self.redraw()
 
-    def is_in_obstacle(self, point):
-        for obs in self.ax.patches:
-            path = Path(obs.get_xy())
-            if path.contains_point(point):
-                return True
-        return False
-
     def random_start_end(self, n, min_dist=10.0):
-        results = []
-        for _ in range(n):
-            tries = 0
-            while True:
-                tries += 1
-                if tries > 1000:
-                    raise RuntimeError("cant find valid start/end points after 1000 tries")
-                start = (random.uniform(*self.ax.get_xlim()), random.uniform(*self.ax.get_ylim()))
-                end = (random.uniform(*self.ax.get_xlim()), random.uniform(*self.ax.get_ylim()))
-                if (not self.is_in_obstacle(start) and
-                    not self.is_in_obstacle(end) and
-                    np.linalg.norm(np.array(start) - np.array(end)) > min_dist):
-                    results.append([start, end])
-                    break
-        return results
+        # 批量采样, 只保留起终点在膨胀栅格上连通的配对, 见 plan_planning_env.sampling
+        obstacles = [obs.get_xy().tolist() for obs in self.ax.patches if isinstance(obs, Polygon)]
+        map_size = [[self.ax.get_xlim()[0], self.ax.get_ylim()[0]], [self.ax.get_xlim()[1], self.ax.get_ylim()[1]]]
+        return random_start_end(obstacles, n, min_dist, map_size=map_size)
 
     def save_map(self):
         file_path = filedialog.asksaveasfilename(
             defaultextension=".pkl",
             initialdir=save_dir,
-            filetypes=[("pickle files", "*.pkl")],
+            filetypes=[("pickle files", "*.pkl"), ("npz datasets", "*.npz")],
             title="save map",
         )
         if file_path:
@@ -307,7 +293,7 @@ class MapEditor:
             
             # generate random start and end points
             if not self.start and not self.end: 
-                start_end_pairs = self.random_start_end(20)
+                start_end_pairs = self.random_start_end(self.runs_per_map)
             else:
                 start_end_pairs = [[self.start, self.end]]
 
@@ -321,43 +307,47 @@ class MapEditor:
                     "end": end
                 })
 
-            with open(file_path, 'wb') as f:
-                pickle.dump(data, f)
+            if file_path.endswith(".npz"):
+                name = os.path.splitext(os.path.basename(file_path))[0]
+                PathDataset.from_maps([data], [name]).save(file_path)
+            else:
+                with open(file_path, 'wb') as f:
+                    pickle.dump(data, f)
             plt.close()
             
     def load_map(self):
         file_path = filedialog.askopenfilename(
             defaultextension=".pkl",
             initialdir=save_dir,
-            filetypes=[("pickle files", "*.pkl")],
+            filetypes=[("pickle files", "*.pkl"), ("npz datasets", "*.npz")],
             title="load map",
         )
         if file_path:
-            with open(file_path, 'rb') as f:
-                data = pickle.load(f)
-                
-                # Clear current map
-                for obs in self.ax.patches[:]:
-                    obs.remove()
-                # Load obstacles
-                for obs in data.get("obstacles", []):
-                    self.ax.add_patch(Polygon(obs,
-                                    fill=True,
-                                    edgecolor='black',
-                                    facecolor='lightblue',
-                                    linewidth=2))
-                
-                # Load start and end points
-                runs = data.get("runs", None)
-                if runs:
-                    # Randomly select a start/end pair
-                    run = random.choice(runs)
-                    self.start = run["start"]
-                    self.end = run["end"]
-                    self.plt_start.set_data([self.start[0]], [self.start[1]])
-                    self.plt_end.set_data([self.end[0]], [self.end[1]])
+            # first map of the file (a .pkl always holds exactly one)
+            data = next(load_maps(file_path))[1]
+            
+            # Clear current map
+            for obs in self.ax.patches[:]:
+                obs.remove()
+            # Load obstacles
+            for obs in data.get("obstacles", []):
+                self.ax.add_patch(Polygon(obs,
+                                fill=True,
+                                edgecolor='black',
+                                facecolor='lightblue',
+                                linewidth=2))
+            
+            # Load start and end points
+            runs = data.get("runs", None)
+            if runs:
+                # Randomly select a start/end pair
+                run = random.choice(runs)
+                self.start = run["start"]
+                self.end = run["end"]
+                self.plt_start.set_data([self.start[0]], [self.start[1]])
+                self.plt_end.set_data([self.end[0]], [self.end[1]])
 
-                self.redraw()
+            self.redraw()
 
     def redraw(self):
         """Redraw canvas"""
@@ -365,7 +355,10 @@ class MapEditor:
 
 # Run the editor
 if __name__ == '__main__':
-    editor = MapEditor()
+    parser = argparse.ArgumentParser(description="draw obstacle maps")
+    parser.add_argument("--runs", type=int, default=20, help="random start/end runs generated when saving a map")
+    args = parser.parse_args()
+    editor = MapEditor(runs_per_map=args.runs)
 
     plt.tight_layout()
     plt.show()
@@ -3,38 +3,211 @@
 
 
 import os
-import glob
+import argparse
+import contextlib
 import pickle
 import time
-from plan_planning_env import Map, WaveFront
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
 
-if __name__ == "__main__":
-   trains_path = './dataset/trains'
-   pkl_files = [f.path for f in os.scandir(trains_path) if f.name.endswith('.pkl') and f.is_file()]
-   for pkl_file in pkl_files:
-        with open(pkl_file, 'rb') as f:
-            trains = pickle.load(f)
-        obstacles = trains.get("obstacles", [])
-        runs = trains.get("runs", None)
+import numpy as np
+from plan_planning_env import Map, WaveFront, OccupancyGridCache, instrument
+from plan_planning_env.dataset import DEFAULT_MAP_SIZE, PathDataset, list_sources, save_pickle
+
+# grids attached in the current worker process, name -> (SharedMemory, ndarray)
+_attached = {}
+_MAX_ATTACHED = 4
+
+
+def attach_grid(name, shape):
+    """ Map a parent's occupancy grid from shared memory (read only, no copy). """
+    if name not in _attached:
+        while len(_attached) >= _MAX_ATTACHED:
+            shm, _ = _attached.pop(next(iter(_attached)))
+            shm.close()
+        # pool workers share the parent's resource tracker, the parent owns and unlinks the block
+        shm = shared_memory.SharedMemory(name=name)
+        grid = np.ndarray(shape, dtype=np.int8, buffer=shm.buf)
+        grid.flags.writeable = False
+        _attached[name] = (shm, grid)
+    return _attached[name][1]
+
+
+def plan_group(job):
+    """ Plan every run of one map that shares an end point, with a single wavefront. """
+    grid = attach_grid(job["grid_name"], job["grid_shape"])
+    starts = job["starts"]
+    custom_map = Map(job["obstacles"], start=starts[0], end=job["end"], map_size=job["map_size"])
+    wf = WaveFront(custom_map, grid=grid)
 
+    metrics = instrument.Metrics() if job["metrics"] else None
+    with instrument.collect(metrics) if metrics is not None else contextlib.nullcontext():
+        start_time = time.time()
+        if len(starts) == 1:
+            paths = [wf.plan()]
+        else:
+            paths = wf.plan_many(starts)
+        end_time = time.time()
+    record = None
+    if metrics is not None:
+        # 同组的 run 共用一次扩散, 记录整组的指标及组大小
+        record = dict(metrics.record(), group_size=len(starts))
+    return paths, (end_time - start_time) / len(starts), record
 
-        # loop through each start-end pair
+
+class MapJob:
+    """ Pending runs of one map and the shared occupancy grid they plan on. """
+    def __init__(self, name, data, save, metrics=False):
+        self.name = name
+        self.metrics = metrics
+        self.data = data
+        self.save = save
+        self.obstacles = self.data.get("obstacles", [])
+        runs = self.data.get("runs", None) or []
+
+        # resume: runs that already have a path are skipped
+        # group pending runs by end point, runs sharing an end reuse one full wavefront
+        self.groups = {}
         for i, run in enumerate(runs):
             if run.get("path") is None:
-                start = run.get("start", None)
-                end = run.get("end", None)
-                custom_map = Map(obs_vertices=obstacles, start=start, end=end)
-                
-                wf = WaveFront(custom_map)
-                start_time = time.time()
-                print(f"Planning path for start: {start}, end: {end}")
-                path = wf.plan()
-                print(path)
-                end_time = time.time()
-
-                if path:
-                    trains["runs"][i]["path"] = path
-                    trains["runs"][i]["time"] = end_time - start_time
-
-        with open(pkl_file, 'wb') as f:
-            pickle.dump(trains, f)
\ No newline at end of file
+                self.groups.setdefault(tuple(run.get("end")), []).append(i)
+        self.remaining = len(self.groups)
+        self.shm = None
+        # 父进程中栅格化/查缓存的指标, 计入该地图每个 run 的 metrics
+        self.grid_metrics = None
+
+    def share_grid(self, grid_cache):
+        map_size = self.data.get("map_size")
+        custom_map = Map(self.obstacles) if map_size is None else Map(self.obstacles, map_size=map_size)
+        if self.metrics:
+            with instrument.collect() as self.grid_metrics:
+                grid = WaveFront(custom_map, cache=grid_cache).grid
+        else:
+            grid = WaveFront(custom_map, cache=grid_cache).grid
+        self.shm = shared_memory.SharedMemory(create=True, size=max(grid.nbytes, 1))
+        shared = np.ndarray(grid.shape, dtype=np.int8, buffer=self.shm.buf)
+        shared[:] = grid
+        self.grid_shape = grid.shape
+
+    def jobs(self):
+        runs = self.data["runs"]
+        for end, indices in self.groups.items():
+            yield indices, {
+                "grid_name": self.shm.name,
+                "grid_shape": self.grid_shape,
+                "obstacles": self.obstacles,
+                "map_size": self.data.get("map_size", DEFAULT_MAP_SIZE),
+                "end": end,
+                "starts": [runs[i].get("start") for i in indices],
+                "metrics": self.metrics,
+            }
+
+    def finish(self):
+        self.save(self.data)
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+def pkl_sources(trains_path):
+    """ One map per pkl file, loaded lazily and written back in place. """
+    for pkl_file in list_sources(trains_path, ('.pkl',)):
+        def load(pkl_file=pkl_file):
+            with open(pkl_file, 'rb') as f:
+                return pickle.load(f)
+        yield pkl_file, load, lambda data, pkl_file=pkl_file: save_pickle(data, pkl_file)
+
+
+def npz_sources(npz_file, finished):
+    """ Every map of a columnar dataset, the whole file is rewritten once all maps are done. """
+    dataset = PathDataset.load(npz_file)
+    for m in range(dataset.num_maps):
+        name = str(dataset.map_names[m])
+        yield f"{npz_file}:{name}", lambda m=m: dataset.map_dict(m), lambda data, name=name: finished.update({name: data})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="plan paths for every run in the dataset")
+    parser.add_argument("--trains-path", default="./dataset/trains", help="directory of pkl maps or a .npz dataset")
+    parser.add_argument("--grid-cache", default="./dataset/grids", help="on-disk occupancy grid cache, '' to disable")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-open-maps", type=int, default=None,
+                        help="maps whose grids are held in shared memory at once (default 2 * workers)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record per-phase timings and counters in each run's 'metrics' field")
+    args = parser.parse_args()
+
+    # 同一地图的所有 run 共享栅格, 并缓存到磁盘供下次重新生成时复用
+    grid_cache = OccupancyGridCache(cache_dir=args.grid_cache or None)
+    finished = {}
+    if args.trains_path.endswith(".npz"):
+        sources = npz_sources(args.trains_path, finished)
+    else:
+        sources = pkl_sources(args.trains_path)
+    source = next(sources, None)
+    max_open = args.max_open_maps or 2 * args.workers
+
+    futures = {}
+    open_maps = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        try:
+            while source is not None or futures:
+                # keep a bounded window of maps in flight
+                while source is not None and open_maps < max_open:
+                    name, load, save = source
+                    source = next(sources, None)
+                    try:
+                        job = MapJob(name, load(), save, metrics=args.metrics)
+                    except Exception as e:
+                        print(f"load {name} error: {e}")
+                        continue
+                    if not job.remaining:
+                        continue
+                    job.share_grid(grid_cache)
+                    open_maps += 1
+                    for indices, payload in job.jobs():
+                        futures[pool.submit(plan_group, payload)] = (job, indices)
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, indices = futures.pop(future)
+                    try:
+                        paths, elapsed, record = future.result()
+                    except Exception as e:
+                        print(f"{job.name} runs {indices} error: {e}")
+                        paths, elapsed, record = [None] * len(indices), 0.0, None
+                    if record is not None and job.grid_metrics is not None:
+                        metrics = instrument.Metrics.from_record(record)
+                        metrics.merge(job.grid_metrics)
+                        record = dict(metrics.record(), group_size=record["group_size"])
+                    for i, path in zip(indices, paths):
+                        if path:
+                            job.data["runs"][i]["path"] = path
+                            job.data["runs"][i]["time"] = elapsed
+                            if record is not None:
+                                job.data["runs"][i]["metrics"] = record
+                    job.remaining -= 1
+                    if job.remaining == 0:
+                        job.finish()
+                        open_maps -= 1
+                        solved = sum(run.get("path") is not None for run in job.data["runs"])
+                        print(f"{job.name}: {solved}/{len(job.data['runs'])} runs planned")
+        finally:
+            # on interruption drop queued jobs and release grids of unfinished maps,
+            # their runs have no path yet and are retried next time
+            pool.shutdown(wait=True, cancel_futures=True)
+            for job in {id(job): job for job, _ in futures.values()}.values():
+                if job.shm is not None and job.remaining:
+                    job.shm.close()
+                    job.shm.unlink()
+
+    if args.trains_path.endswith(".npz") and finished:
+        # maps without pending runs are kept as they are
+        dataset = PathDataset.load(args.trains_path)
+        names = [str(name) for name in dataset.map_names]
+        maps = [finished.get(name) or dataset.map_dict(m) for m, name in enumerate(names)]
+        PathDataset.from_maps(maps, names).save(args.trains_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,23 @@
 # Email: butteriaaa@gmail.com
 # Created on: 2025-06-06 12:34:26
 # Description:
+import importlib
 
-from .env import Map, PathPlanningWithLidar
-from .solutions import RRT, WaveFront
-# from .transformer import LidarPathTransformer, PathPredictor
-__all__ = ["Map", "PathPlanningWithLidar", "RRT", "WaveFront", "LidarPathTransformer", "PathPredictor"]
+# 导出名 -> 所在子模块. 按需导入, import plan_planning_env.lite 等子模块时不会连带导入 gym/matplotlib/shapely/scipy;
+# python -m plan_planning_env.sampling 也不会被 runpy 重复导入并警告
+_EXPORTS = {
+    "Map": ".env", "PathPlanningWithLidar": ".env", "VectorPathPlanningWithLidar": ".env",
+    "RRT": ".solutions", "RRTStar": ".solutions", "WaveFront": ".solutions", "AStar": ".solutions", "JPS": ".solutions",
+    "OccupancyGridCache": ".cache",
+    "StartEndSampler": ".sampling",
+    "LidarPathTransformer": ".transformer", "PathPredictor": ".transformer",
+}
+__all__ = ["Map", "PathPlanningWithLidar", "VectorPathPlanningWithLidar", "RRT", "RRTStar", "WaveFront", "AStar", "JPS", "OccupancyGridCache", "StartEndSampler", "instrument", "LidarPathTransformer", "PathPredictor"]
+
+
+def __getattr__(name):
+    if name == "instrument":
+        return importlib.import_module(".instrument", __name__)
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
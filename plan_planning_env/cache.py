@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-22 14:18:05
+# Description: 栅格地图缓存, 同一地图的多次规划只栅格化一次
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from . import instrument
+from .dataset import atomic_write
+
+
+class OccupancyGridCache:
+    """
+    以 (障碍物几何哈希, 地图范围, grid_resolution, safe_margin) 为键的栅格缓存.
+    内存中按 LRU 淘汰; 指定 cache_dir 时同时读写 <key>.npy, 重新生成数据集时可直接复用.
+    缓存的栅格是只读的, 多个 WaveFront 实例共享同一数组.
+    """
+    def __init__(self, max_entries=32, cache_dir=None):
+        """ Args:
+                max_entries (int): 内存中最多保留的栅格个数.
+                cache_dir (str): 磁盘缓存目录, None 表示只用内存.
+        """
+        self.max_entries = int(max_entries)
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._grids = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._grids)
+
+    @staticmethod
+    def key(Map, grid_resolution, safe_margin):
+        h = hashlib.sha1()
+        h.update(np.asarray(Map.size, dtype=np.float64).tobytes())
+        h.update(np.array([grid_resolution, safe_margin], dtype=np.float64).tobytes())
+        for obstacle in Map.obstacles:
+            coords = np.asarray(obstacle.exterior.coords, dtype=np.float64)
+            h.update(np.int64(len(coords)).tobytes())
+            h.update(coords.tobytes())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def get(self, key, build):
+        """ 查询缓存, 未命中时调用 build() 生成栅格并写入缓存. """
+        grid = self._grids.get(key)
+        if grid is not None:
+            self._grids.move_to_end(key)
+            self.hits += 1
+            instrument.count("grid_cache.hits")
+            return grid
+
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            with instrument.phase("grid_cache.load"):
+                grid = np.load(self._path(key))
+            self.disk_hits += 1
+            instrument.count("grid_cache.disk_hits")
+        else:
+            grid = build()
+            self.misses += 1
+            instrument.count("grid_cache.misses")
+            if self.cache_dir is not None:
+                self._save(key, grid)
+
+        grid.flags.writeable = False
+        self._grids[key] = grid
+        while len(self._grids) > self.max_entries:
+            self._grids.popitem(last=False)
+        return grid
+
+    def _save(self, key, grid):
+        # 先写临时文件再替换, 避免并发读到不完整的文件
+        atomic_write(self._path(key), lambda f: np.save(f, grid), suffix=".npy.tmp")
+
+    def clear(self):
+        self._grids.clear()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-25 20:47:12
+# Description: 列式数据集格式, 替代逐地图 pickle 的 dict/list
+import argparse
+import os
+import pickle
+import struct
+import tempfile
+import zipfile
+
+import numpy as np
+
+# 列名 -> 含义
+#   map_names               (M,)      地图名(一般为来源 pkl 的文件名)
+#   map_size                (M, 2, 2) 地图范围 [[min_x, min_y], [max_x, max_y]]
+#   map_obstacle_offsets    (M + 1,)  每张地图的障碍物在 obstacle_vertex_offsets 中的区间
+#   obstacle_vertex_offsets (O + 1,)  每个障碍物的顶点在 vertices 中的区间
+#   vertices                (V, 2)    所有障碍物顶点
+#   map_run_offsets         (M + 1,)  每张地图的 run 区间
+#   run_start, run_end      (R, 2)    起终点
+#   run_time                (R,)      规划耗时(s), 未规划为 nan
+#   run_path_offsets        (R + 1,)  每个 run 的路径在 path_points 中的区间, 长度为 0 表示没有路径
+#   path_points             (P, 2)    所有路径点
+COLUMNS = ("map_names", "map_size", "map_obstacle_offsets", "obstacle_vertex_offsets", "vertices",
+           "map_run_offsets", "run_start", "run_end", "run_time", "run_path_offsets", "path_points")
+
+DEFAULT_MAP_SIZE = [[-10.0, -10.0], [10.0, 10.0]]
+
+
+def atomic_write(path, write, suffix=".tmp"):
+    """ 先写入同目录下的临时文件再替换 path, 中断或出错时不会留下不完整的文件.
+        Args:
+            write (callable): write(f), 向以二进制写方式打开的临时文件写入内容.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_pickle(data, path):
+    """ 原子地写入旧格式的 pkl 地图. """
+    atomic_write(path, lambda f: pickle.dump(data, f), suffix=".pkl.tmp")
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _load_npz(path, mmap=True):
+    """ 读取 npz. mmap 为 True 且成员未压缩时, 直接把 zip 中的数组内存映射, 不读入内存. """
+    if not mmap:
+        with np.load(path, allow_pickle=False) as f:
+            return {name: f[name] for name in f.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as fh:
+        for info in zf.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            # 本地文件头 30 字节, 之后是文件名和 extra 字段, 再之后才是 .npy 数据
+            fh.seek(info.header_offset)
+            header = fh.read(30)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            fh.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fh)
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=fh.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+class PathDataset:
+    """
+    列式存储的地图/run/路径数据集. 所有数据保存在少数几个连续的 float32/int64 数组中,
+    通过 offsets 随机访问; 保存为单个未压缩的 .npz, 读取时可直接内存映射.
+    """
+    def __init__(self, columns):
+        missing = [name for name in COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"dataset is missing columns: {missing}")
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    @property
+    def num_maps(self):
+        return len(self.map_names)
+
+    @property
+    def num_runs(self):
+        return len(self.run_start)
+
+    def __len__(self):
+        return self.num_maps
+
+    # ------------------------------------------------------------------ 写
+    @classmethod
+    def from_maps(cls, maps, names=None):
+        """ 由旧格式的 dict ({"obstacles": [...], "runs": [...]}) 列表构建. """
+        names = [str(i) for i in range(len(maps))] if names is None else [str(name) for name in names]
+        map_size, obstacle_counts, vertex_counts, vertices = [], [], [], []
+        run_counts, starts, ends, times, path_lengths, points = [], [], [], [], [], []
+        for data in maps:
+            obstacles = data.get("obstacles", []) or []
+            runs = data.get("runs", []) or []
+            map_size.append(data.get("map_size", DEFAULT_MAP_SIZE))
+            obstacle_counts.append(len(obstacles))
+            for obstacle in obstacles:
+                obstacle = np.asarray(obstacle, dtype=np.float32).reshape(-1, 2)
+                vertex_counts.append(len(obstacle))
+                vertices.append(obstacle)
+            run_counts.append(len(runs))
+            for run in runs:
+                starts.append(run.get("start"))
+                ends.append(run.get("end"))
+                time = run.get("time")
+                times.append(np.nan if time is None else time)
+                path = run.get("path")
+                if path is None or len(path) == 0:
+                    path_lengths.append(0)
+                else:
+                    path = np.asarray(path, dtype=np.float32).reshape(-1, 2)
+                    path_lengths.append(len(path))
+                    points.append(path)
+
+        def stack(items):
+            return np.concatenate(items).astype(np.float32) if items else np.empty((0, 2), dtype=np.float32)
+
+        vertex_offsets = _offsets(vertex_counts)
+        return cls({
+            "map_names": np.array(names, dtype=str),
+            "map_size": np.asarray(map_size, dtype=np.float32).reshape(-1, 2, 2),
+            "map_obstacle_offsets": _offsets(obstacle_counts),
+            "obstacle_vertex_offsets": vertex_offsets,
+            "vertices": stack(vertices),
+            "map_run_offsets": _offsets(run_counts),
+            "run_start": np.asarray(starts, dtype=np.float32).reshape(-1, 2),
+            "run_end": np.asarray(ends, dtype=np.float32).reshape(-1, 2),
+            "run_time": np.asarray(times, dtype=np.float32),
+            "run_path_offsets": _offsets(path_lengths),
+            "path_points": stack(points),
+        })
+
+    def save(self, path):
+        """ 原子地写入单个未压缩 .npz. """
+        atomic_write(path, lambda f: np.savez(f, **{name: np.asarray(getattr(self, name)) for name in COLUMNS}),
+                     suffix=".npz.tmp")
+
+    # ------------------------------------------------------------------ 读
+    @classmethod
+    def load(cls, path, mmap=True):
+        """ Args:
+                path (str): .npz 文件.
+                mmap (bool): 内存映射各列, 不把整个数据集读入内存.
+        """
+        return cls(_load_npz(path, mmap=mmap))
+
+    def map_index(self, name):
+        matches = np.flatnonzero(self.map_names == str(name))
+        if len(matches) == 0:
+            raise KeyError(name)
+        return int(matches[0])
+
+    def obstacles(self, m):
+        """ 地图 m 的障碍物顶点, list[(k, 2) ndarray]. """
+        lo, hi = self.map_obstacle_offsets[m], self.map_obstacle_offsets[m + 1]
+        offsets = self.obstacle_vertex_offsets[lo:hi + 1]
+        return [self.vertices[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def runs(self, m):
+        """ 地图 m 的 run 在全局 run 数组中的下标. """
+        return range(int(self.map_run_offsets[m]), int(self.map_run_offsets[m + 1]))
+
+    def path(self, r):
+        """ run r 的路径 (n, 2), 没有路径时返回 None. """
+        lo, hi = self.run_path_offsets[r], self.run_path_offsets[r + 1]
+        return self.path_points[lo:hi] if hi > lo else None
+
+    def map_dict(self, m):
+        """ 转换为旧格式的 dict, 供原有脚本使用. """
+        runs = []
+        for r in self.runs(m):
+            run = {"start": tuple(self.run_start[r].tolist()), "end": tuple(self.run_end[r].tolist())}
+            path = self.path(r)
+            if path is not None:
+                run["path"] = [np.array(p, dtype=np.float64) for p in path]
+            if not np.isnan(self.run_time[r]):
+                run["time"] = float(self.run_time[r])
+            runs.append(run)
+        return {
+            "obstacles": [obstacle.tolist() for obstacle in self.obstacles(m)],
+            "map_size": self.map_size[m].tolist(),
+            "runs": runs,
+        }
+
+    def maps(self):
+        for m in range(self.num_maps):
+            yield self.map_names[m], self.map_dict(m)
+
+
+def load_maps(path):
+    """ 逐张读取 .pkl (单张地图) 或 .npz (数据集), 产生 (名称, 旧格式 dict).
+        .npz 在迭代到某张地图时才转换它, 不一次构建整个数据集的 dict.
+    """
+    if path.endswith(".npz"):
+        yield from PathDataset.load(path).maps()
+        return
+    with open(path, 'rb') as f:
+        yield os.path.splitext(os.path.basename(path))[0], pickle.load(f)
+
+
+def list_sources(paths, suffixes=('.pkl', '.npz')):
+    """ 展开文件和目录, 目录下取后缀匹配的文件并按路径排序. 文件按给定顺序原样保留.
+        Args:
+            paths (str | list[str]): 文件或目录.
+    """
+    files = []
+    for p in [paths] if isinstance(paths, str) else paths:
+        if os.path.isdir(p):
+            files += sorted(f.path for f in os.scandir(p) if f.name.endswith(suffixes) and f.is_file())
+        else:
+            files.append(p)
+    return files
+
+
+def convert_pkl(pkl_paths, out_path):
+    """ 把若干旧格式 pkl 合并转换为一个 .npz 数据集. """
+    names, maps = [], []
+    for pkl_path in pkl_paths:
+        with open(pkl_path, 'rb') as f:
+            maps.append(pickle.load(f))
+        names.append(os.path.splitext(os.path.basename(pkl_path))[0])
+    dataset = PathDataset.from_maps(maps, names)
+    dataset.save(out_path)
+    return dataset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="convert pickled maps to the columnar .npz dataset format")
+    parser.add_argument("pkls", nargs="+", help="pkl files or directories containing them")
+    parser.add_argument("-o", "--output", required=True, help="output .npz file")
+    args = parser.parse_args()
+
+    dataset = convert_pkl(list_sources(args.pkls, ('.pkl',)), args.output)
+    print(f"{args.output}: {dataset.num_maps} maps, {dataset.num_runs} runs, {len(dataset.path_points)} path points")
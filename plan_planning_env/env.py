@@ -7,8 +7,13 @@
 import gym
 import numpy as np
 import matplotlib.pyplot as plt
+import shapely
+from shapely import STRtree
 from shapely.geometry import Polygon, LineString, Point
-from shapely.plotting import plot_polygon
+
+from . import instrument
+from .geometry import polygon_edges, cast_rays, cast_ray_batches, march_rays
+from .solutions import GridPlanner
 
 plt.rcParams['toolbar'] = 'None'
 plt.rcParams['xtick.bottom'] = False
@@ -29,14 +34,77 @@ class Map:
         self.end = end
         # convert vertices to polygons
         self.obstacles = [ Polygon(obs) for obs in obstacles ]
+        # 预先提取所有障碍物的边, 供 numpy 射线求交使用
+        self.edges, self.edge_owners = polygon_edges(self.obstacles)
+        # 障碍物包围盒的空间索引, 射线/碰撞检测只需测试附近的候选障碍物
+        self.index = STRtree(self.obstacles)
+        # 预处理后批量的 intersects/contains 判断更快
+        shapely.prepare(self.index.geometries)
+
+    def query(self, geometry, margin=0.0):
+        """ 查询包围盒与 geometry 相交的候选障碍物.
+            Args:
+                geometry: shapely 几何体.
+                margin (float): 包围盒外扩距离(m), 用于膨胀后的障碍物.
+            Returns:
+                ndarray: 候选障碍物在 self.obstacles 中的下标(升序).
+        """
+        if margin > 0:
+            min_x, min_y, max_x, max_y = geometry.bounds
+            geometry = shapely.box(min_x - margin, min_y - margin, max_x + margin, max_y + margin)
+        return np.sort(self.index.query(geometry))
+
+    def edge_mask(self, candidates):
+        """ 候选障碍物对应的边在 self.edges 中的布尔掩码. """
+        selected = np.zeros(len(self.obstacles), dtype=bool)
+        selected[candidates] = True
+        return selected[self.edge_owners]
+
+    def segments_collide(self, segments):
+        """ 批量碰撞检测, 线段与任一障碍物接触/相交/位于其内部即为碰撞 (闭集 intersects 语义).
+            一次空间索引查询得到所有 (线段, 候选障碍物) 对, 再一次向量化判断.
+            Args:
+                segments (ndarray): (M, 4) 线段 [x1, y1, x2, y2].
+            Returns:
+                ndarray: (M,) bool.
+        """
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        hit = np.zeros(len(segments), dtype=bool)
+        if len(segments) == 0 or len(self.obstacles) == 0:
+            return hit
+        lines = shapely.linestrings(segments.reshape(-1, 2, 2))
+        segment_idx, obstacle_idx = self.index.query(lines)
+        instrument.count("collision.segments", len(segments))
+        instrument.count("collision.obstacles_tested", len(obstacle_idx))
+        if len(segment_idx):
+            hit[segment_idx[shapely.intersects(lines[segment_idx], self.index.geometries[obstacle_idx])]] = True
+        return hit
 
 class Lidar():
-    def __init__(self, Map, max_range=20.0, scan_angle=128.0, num_angle=128):
+    BACKENDS = ('numpy', 'shapely', 'grid')
+
+    def __init__(self, Map, max_range=20.0, scan_angle=128.0, num_angle=128, backend='numpy',
+                 incremental=False, margin=None, grid_resolution=0.05, grid=None, grid_cache=None):
         """ Args:
                 max_range (float): 最大扫描距离(m).
                 scan_angle (float): 最大扫描角度(deg).
                 num_angle (int): 扫描角度个数.
+                backend (str): 'numpy' 批量求交; 'shapely' 逐条射线求交, 作为参考实现;
+                    'grid' 在占据栅格上 DDA 遍历, 耗时与多边形复杂度无关, 误差一般在一个栅格内(掠过细长障碍物的射线除外).
+                incremental (bool): 增量模式, 适合沿路径连续移动:
+                    保留 max_range + margin 范围内障碍物的边作为工作集, 位姿离开工作集中心 margin 后才重新查询;
+                    同一位姿的测距结果只计算一次, step() 和 render() 共用. 统计见 hit_stats().
+                margin (float): 工作集外扩距离(m), 默认 max_range / 4.
+                grid_resolution (float): 'grid' 后端的栅格边长(m).
+                grid (ndarray): 'grid' 后端使用的已有占据栅格(例如 WaveFront.grid, 注意其障碍物已膨胀),
+                    坐标与 GridPlanner 相同; None 时按 grid_resolution 栅格化未膨胀的障碍物.
+                grid_cache (OccupancyGridCache): 栅格化时使用的缓存.
         """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"unknown lidar backend: {backend}, expected one of {self.BACKENDS}")
+        self.backend = backend
+        self.incremental = incremental
+        self.margin = float(max_range) / 4 if margin is None else float(margin)
         self.max_range = float(max_range)
         self.scan_angle = float(scan_angle)
         self.num_angle = int(num_angle)
@@ -44,8 +112,31 @@ class Lidar():
         # 偏航角初始为正北方
         self.yaw = np.deg2rad(90.0)
 
+        self.map = Map
         self.obstacles = Map.obstacles
+        self.edges = Map.edges
         self.__ray_angles = np.deg2rad(np.linspace(-self.scan_angle/2, self.scan_angle/2, self.num_angle))
+        # observe() 复用的定长观测缓冲区
+        self.ranges_buffer = np.zeros(self.num_angle, dtype=np.float32)
+        self.hit_mask = np.zeros(self.num_angle, dtype=bool)
+
+        self.grid = None
+        if backend == 'grid':
+            self.grid_resolution = float(grid_resolution)
+            # 与 GridPlanner 相同的栅格坐标, 不膨胀障碍物
+            self.grid = GridPlanner(Map, self.grid_resolution, safe_margin=0.0, cache=grid_cache, grid=grid).grid
+
+        # 增量模式: 工作集中心, 工作集内的障碍物/边/边的包围盒, 以及最近一次位姿的测距结果
+        self.__anchor = None
+        self.__working_polygons = None
+        self.__working_edges = None
+        self.__working_bounds = None
+        self.__scan_memo = None
+        self.__distance_memo = None
+        self.__observe_pose = None
+        # ranges_buffer / hit_mask 中结果对应的位姿
+        self.__buffer_pose = None
+        self.stats = {"scans": 0, "memo_hits": 0, "refreshes": 0, "rays": 0, "ray_hits": 0}
 
 
     def scan(self):
@@ -55,6 +146,17 @@ class Lidar():
                 self.yaw (float): 偏航角(rad).
 
         """
+        if not self.incremental:
+            return self.__scan()
+        pose = self.__pose()
+        if self.__scan_memo is not None and self.__scan_memo[0] == pose:
+            self.stats["memo_hits"] += 1
+            return self.__scan_memo[1]
+        result = self.__scan()
+        self.__scan_memo = (pose, result)
+        return result
+
+    def __scan(self):
         # 激光与障碍物交点
         scan_points = []
         scan_distances = []
@@ -72,32 +174,186 @@ class Lidar():
         ]
 
         # 碰撞
-        for obstacle in self.obstacles:
-            if obstacle.contains(Point(self.x,self.y)):
-                return scan_distances, scan_points, ray_lines
+        distances = None if self.backend == 'shapely' else self.__measure()
+        if (self.in_obstacle() if distances is None else distances is self.__INSIDE):
+            return scan_distances, scan_points, ray_lines
 
         # 雷达测距
-        for i, angle in enumerate(self.__ray_angles):
-            line = LineString([
-                (self.x, self.y),
-                (self.x + self.max_range * np.cos(self.yaw + angle), self.y + self.max_range * np.sin(self.yaw + angle))
-            ])
+        if self.backend == 'shapely':
+            for i, angle in enumerate(self.__ray_angles):
+                line = LineString([
+                    (self.x, self.y),
+                    (self.x + self.max_range * np.cos(self.yaw + angle), self.y + self.max_range * np.sin(self.yaw + angle))
+                ])
 
-            point, distance = self.__compute_intersection(line)
-            if point is not None:
-                scan_distances.append(distance)
-                scan_points.append(point)
+                point, distance = self.__compute_intersection(line)
+                if point is not None:
+                    scan_distances.append(distance)
+                    scan_points.append(point)
+        else:
+            hit = np.isfinite(distances)
+            points = self.__ray_points(distances)
+            scan_distances = distances[hit].tolist()
+            scan_points = points[hit].tolist()
 
         return scan_distances, scan_points, ray_lines
 
+    def in_obstacle(self):
+        instrument.count("lidar.in_obstacle_checks")
+        if self.incremental:
+            polygons = self.__working_set()[0]
+            return bool(len(polygons)) and bool(shapely.contains_xy(polygons, self.x, self.y).any())
+        nearby = self.map.query(Point(self.x, self.y))
+        return bool(len(nearby)) and bool(shapely.contains_xy([self.obstacles[i] for i in nearby], self.x, self.y).any())
+
+    def ranges(self):
+        """ 定长的测距结果, 与 scan() 不同, 未命中的射线记为 max_range 而不是丢弃.
+            Returns:
+                ndarray: (num_angle,) float32, 位于障碍物内时全为 0.
+        """
+        return self.observe()[0].copy()
+
+    def observe(self):
+        """ 定长观测, 写入复用的 self.ranges_buffer / self.hit_mask 并返回它们(不分配新数组),
+            下一次调用会覆盖其内容, 需要保留时由调用方复制.
+            Returns:
+                ranges (ndarray): (num_angle,) float32, 未命中为 max_range, 位于障碍物内时全为 0.
+                hit (ndarray): (num_angle,) bool, 射线在 max_range 内命中障碍物, 位于障碍物内时全为 True.
+        """
+        pose = self.__pose() if self.incremental else None
+        if pose is not None and self.__observe_pose == pose:
+            # 缓冲区中已是该位姿的结果
+            self.stats["memo_hits"] += 1
+            return self.ranges_buffer, self.hit_mask
+        distances = self.__measure()
+        if distances is self.__INSIDE:
+            self.ranges_buffer[:] = 0.0
+            self.hit_mask[:] = True
+        else:
+            np.isfinite(distances, out=self.hit_mask)
+            np.minimum(distances, self.max_range, out=self.ranges_buffer, casting='same_kind')
+        self.__observe_pose = pose
+        self.__buffer_pose = self.__pose()
+        return self.ranges_buffer, self.hit_mask
+
+    def hit_points(self):
+        """ 当前位姿下的命中点 (H, 2). 缓冲区中已是该位姿的结果时直接复用, 不重新测距.
+            位于障碍物内时为空.
+        """
+        if self.__buffer_pose != self.__pose():
+            self.observe()
+        hit = self.hit_mask & (self.ranges_buffer > 0)
+        return np.array([self.x, self.y]) + self.ranges_buffer[hit, None] * self.__ray_directions()[hit]
+
+    def hit_stats(self):
+        """ 增量模式的统计: 实际计算的扫描次数, 复用上一位姿结果的次数, 工作集刷新次数, 射线命中率. """
+        stats = dict(self.stats)
+        requests = stats["scans"] + stats["memo_hits"]
+        stats["memo_hit_rate"] = stats["memo_hits"] / requests if requests else 0.0
+        stats["refresh_rate"] = stats["refreshes"] / stats["scans"] if stats["scans"] else 0.0
+        stats["ray_hit_rate"] = stats["ray_hits"] / stats["rays"] if stats["rays"] else 0.0
+        return stats
+
+    # __measure() 在位于障碍物内时返回的标记
+    __INSIDE = np.zeros(0)
+
+    def __pose(self):
+        return float(self.x), float(self.y), float(self.yaw)
+
+    def __measure(self):
+        """ 所有射线的距离 (num_angle,) float64, 未命中为 inf; 位于障碍物内时返回 __INSIDE.
+            增量模式下按位姿缓存, 同一位姿的 scan()/observe() 只计算一次.
+        """
+        pose = self.__pose() if self.incremental else None
+        if pose is not None and self.__distance_memo is not None and self.__distance_memo[0] == pose:
+            self.stats["memo_hits"] += 1
+            return self.__distance_memo[1]
+        self.stats["scans"] += 1
+        if self.in_obstacle():
+            distances = self.__INSIDE
+        elif self.backend == 'grid':
+            instrument.count("lidar.rays", self.num_angle)
+            with instrument.phase("lidar.march"):
+                distances = march_rays(self.grid, self.map.size[0], self.grid_resolution, (self.x, self.y),
+                                       self.__ray_directions(), self.max_range)
+        elif self.backend == 'shapely':
+            distances = np.full(self.num_angle, np.inf)
+            for i, direction in enumerate(self.__ray_directions()):
+                line = LineString([(self.x, self.y), (self.x + self.max_range * direction[0], self.y + self.max_range * direction[1])])
+                point, distance = self.__compute_intersection(line)
+                if point is not None:
+                    distances[i] = distance
+        else:
+            distances = self.__cast_rays()
+        if distances is not self.__INSIDE:
+            self.stats["rays"] += self.num_angle
+            self.stats["ray_hits"] += int(np.count_nonzero(np.isfinite(distances)))
+        if pose is not None:
+            self.__distance_memo = (pose, distances)
+        return distances
+
+    def __working_set(self):
+        """ 以工作集中心为圆心 max_range + margin 范围内的障碍物及其边.
+            位姿离中心不超过 margin 时, 任一射线都落在该范围内, 无需重新查询.
+        """
+        if self.__anchor is None or np.hypot(self.x - self.__anchor[0], self.y - self.__anchor[1]) > self.margin:
+            r = self.max_range + self.margin
+            candidates = self.map.query(shapely.box(self.x - r, self.y - r, self.x + r, self.y + r))
+            self.__working_polygons = self.map.index.geometries[candidates]
+            self.__working_edges = self.edges[self.map.edge_mask(candidates)]
+            e = self.__working_edges
+            self.__working_bounds = np.stack([np.minimum(e[:, 0], e[:, 2]), np.minimum(e[:, 1], e[:, 3]),
+                                              np.maximum(e[:, 0], e[:, 2]), np.maximum(e[:, 1], e[:, 3])], axis=1)
+            self.__anchor = (float(self.x), float(self.y))
+            self.stats["refreshes"] += 1
+            instrument.count("lidar.working_set_refreshes")
+        return self.__working_polygons, self.__working_edges, self.__working_bounds
+
+    def as_tensor(self):
+        """ 与 ranges_buffer 共享内存的 torch 张量(零拷贝), 之后每次 observe() 都会原地更新它. """
+        import torch  # torch 只在训练/推理时需要
+        return torch.from_numpy(self.ranges_buffer)
+
+    def __ray_directions(self):
+        angles = self.yaw + self.__ray_angles
+        return np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+    def __ray_points(self, distances):
+        return np.array([self.x, self.y]) + distances[:, None] * self.__ray_directions()
+
+    # 所有射线一次性与扫描范围内障碍物的边求交, 未命中为 inf
+    def __cast_rays(self):
+        directions = self.__ray_directions()
+        origins = np.broadcast_to(np.array([self.x, self.y], dtype=np.float64), (self.num_angle, 2))
+        ends = origins + self.max_range * directions
+        low = np.minimum(ends.min(axis=0), origins[0])
+        high = np.maximum(ends.max(axis=0), origins[0])
+        if self.incremental:
+            # 工作集内包围盒与扫描扇区相交的边
+            _, edges, bounds = self.__working_set()
+            edges = edges[(bounds[:, 2] >= low[0]) & (bounds[:, 0] <= high[0])
+                          & (bounds[:, 3] >= low[1]) & (bounds[:, 1] <= high[1])]
+        else:
+            candidates = self.map.query(shapely.box(*low, *high))
+            edges = self.edges
+            if len(candidates) < len(self.obstacles):
+                edges = edges[self.map.edge_mask(candidates)]
+            instrument.count("lidar.obstacles_tested", len(candidates))
+        instrument.count("lidar.rays", self.num_angle)
+        instrument.count("lidar.edges_tested", len(edges))
+        with instrument.phase("lidar.intersect"):
+            return cast_rays(origins, directions, edges, self.max_range)
+
     # 计算雷达射线和障碍物的交点和距离
     def __compute_intersection(self, ray_line: LineString):
         point = None
         distance = self.max_range
 
-        # TODO: O(n)
-        for obstacle in self.obstacles:
-            intersections = obstacle.intersection(ray_line)
+        candidates = self.map.query(ray_line)
+        instrument.count("lidar.rays")
+        instrument.count("lidar.obstacles_tested", len(candidates))
+        for i in candidates:
+            intersections = self.obstacles[i].intersection(ray_line)
             if intersections.is_empty:
                 continue
             if intersections.geom_type in {'MultiPoint', 'MultiLineString', 'GeometryCollection'}:
@@ -118,23 +374,44 @@ class Lidar():
 class PathPlanningWithLidar(gym.Env):
 
     # 定义render模式
-    metadata = {'render.modes': ['human']}
+    metadata = {'render.modes': ['human', 'rgb_array']}
 
-    def __init__(self, MAP):
+    OBSERVATIONS = ('scan', 'ranges')
+
+    def __init__(self, MAP, lidar_backend='numpy', observation='scan', lidar_incremental=False, renderer=None,
+                 lidar_grid=None, lidar_grid_resolution=0.05, lidar_grid_cache=None):
+        """ Args:
+                lidar_incremental (bool): 激光雷达使用增量模式, 见 Lidar.
+                lidar_grid, lidar_grid_resolution, lidar_grid_cache: 'grid' 后端的 grid, grid_resolution,
+                    grid_cache, 见 Lidar. 例如传入 WaveFront(MAP).grid 与其 grid_resolution, 不再重新栅格化.
+                renderer (LidarRenderer): render() 使用的渲染器, 例如离屏写视频/PNG 序列的渲染器,
+                    由调用方负责 finish()/close(), 可在多个回放间复用. None 时 render() 按需创建.
+                observation (str): step() 返回的观测.
+                    'scan': (x, y, 命中距离列表), 未命中的射线被丢弃;
+                    'ranges': (x, y, ranges, hit), 定长 float32 测距和命中掩码, 为 lidar 复用的缓冲区.
+        """
         super(PathPlanningWithLidar, self).__init__()
+        if observation not in self.OBSERVATIONS:
+            raise ValueError(f"unknown observation: {observation}, expected one of {self.OBSERVATIONS}")
+        self.observation = observation
 
         self.map = MAP
-        self.lidar = Lidar(self.map)
+        self.lidar = Lidar(self.map, backend=lidar_backend, incremental=lidar_incremental,
+                           grid_resolution=lidar_grid_resolution, grid=lidar_grid, grid_cache=lidar_grid_cache)
 
         # used for render function
-        self.fig = None
-        
+        self.renderer = renderer
+        self.__own_renderer = False
+        # scan 观测时 step() 得到的 (位姿, 命中点), render() 直接复用
+        self.__scan_points = None
+
         self.path = None
         self.__path_index = -1
 
     def reset(self):
         self.lidar.x, self.lidar.y = self.map.start # reset lidar position
         self.lidar.yaw = np.deg2rad(90.0)  # reset lidar yaw to north
+        self.__path_index = -1  # 同一个 env 可以回放多条路径
 
 
     def step(self, action=1):
@@ -143,54 +420,184 @@ class PathPlanningWithLidar(gym.Env):
         # """
         self.__path_index += action
         if self.__path_index == 0:
-            return False, (self.lidar.x, self.lidar.y, self.lidar.scan()[0])
+            return False, self.__observe()
         
-        if not self.path or self.__path_index < 0 or self.__path_index >= len(self.path):
-            return True, (self.lidar.x, self.lidar.y, self.lidar.scan()[0])  # done_state, observation
+        if self.path is None or len(self.path) == 0 or self.__path_index < 0 or self.__path_index >= len(self.path):
+            return True, self.__observe()  # done_state, observation
         self.lidar.x, self.lidar.y = self.path[self.__path_index]
         self.lidar.yaw = np.arctan2(self.path[self.__path_index][1] - self.path[self.__path_index-1][1],
                                     self.path[self.__path_index][0] - self.path[self.__path_index-1][0])
         
-        return False, (self.lidar.x, self.lidar.y, self.lidar.scan()[0])  # done_state, observation
+        return False, self.__observe()  # done_state, observation
+
+    def __observe(self):
+        if self.observation == 'ranges':
+            ranges, hit = self.lidar.observe()
+            return self.lidar.x, self.lidar.y, ranges, hit
+        distances, points, _ = self.lidar.scan()
+        self.__scan_points = ((self.lidar.x, self.lidar.y, self.lidar.yaw), points)
+        return self.lidar.x, self.lidar.y, distances
+
+    def hit_points(self):
+        """ 当前位姿的激光命中点 (H, 2), 优先复用 step() 得到的观测. """
+        if self.__scan_points is not None and self.__scan_points[0] == (self.lidar.x, self.lidar.y, self.lidar.yaw):
+            return np.asarray(self.__scan_points[1], dtype=np.float64).reshape(-1, 2)
+        return self.lidar.hit_points()
 
     def render(self, mode='human'):
-        if self.fig is None:
-            plt.ion()
-            # ax config
-            self.fig, self.ax = plt.subplots(figsize=(10, 10))
-            self.ax.set_title('Path Planning')
-
-            self.ax.set_xlim(self.map.size[0][0], self.map.size[1][0])
-            self.ax.set_ylim(self.map.size[0][1], self.map.size[1][1])
-            self.car, = self.ax.plot([], [], 'ro', markersize=10)
-            self.ray1, = self.ax.plot([], [], color='orange', linewidth=0.5, linestyle='--', label='Lidar Rays')
-            self.ray2, = self.ax.plot([], [], color='orange', linewidth=0.5, linestyle='--', label='Lidar Rays')
-            self.points = self.ax.scatter([], [], c='red', s=10, label='Lidar Hits')
-            
-            self.end = self.ax.plot(self.map.end[0], self.map.end[1], 'go', markersize=10, label='Goal')
-            self.start = self.ax.plot(self.map.start[0], self.map.start[1], 'bo', markersize=10, label='Start')
-            if hasattr(self, "path") and self.path is not None and len(self.path) > 1:
-                path_arr = np.array(self.path)
-                self.ax.plot(path_arr[:, 0], path_arr[:, 1], color='blue', linewidth=2, label='RRT Path')
-            # draw obstacles
-            for obstacle in self.map.obstacles:
-                plot_polygon(obstacle, ax=self.ax, facecolor='lightblue', edgecolor='black', add_points=False)
-
-        # show lidar points
-        scan_distances, scan_points, ray_lines = self.lidar.scan()
-        if scan_points:
-            scan_points = np.array(scan_points)
-            self.points.set_offsets(scan_points)
-        # 画出雷达射线
-        self.ray1.set_data(ray_lines[0].xy)
-        self.ray2.set_data(ray_lines[1].xy)
-        self.car.set_data(self.lidar.x, self.lidar.y)
-        
-        plt.pause(0.05)
-        
+        """ 静态图层只绘制一次, 每帧只 blit 动态部分, 不再 plt.pause.
+            Args:
+                mode (str): 'human' 交互窗口; 'rgb_array' 返回 (H, W, 3) uint8 图像, 离屏渲染.
+                    传入 renderer 时使用该渲染器, 忽略 mode.
+        """
+        if self.renderer is None:
+            from .render import LidarRenderer
+            self.renderer = LidarRenderer(headless=mode != 'human')
+            self.__own_renderer = True
+        frame = self.renderer.draw(self)
+        if mode == 'rgb_array' and frame is not None:
+            return frame[..., :3].copy()
 
     def close(self):
-        if self.fig is not None:
-            plt.ioff()
-            plt.close(self.fig)
-            self.fig = None
\ No newline at end of file
+        if self.renderer is not None and self.__own_renderer:
+            self.renderer.close()
+            self.renderer = None
+            self.__own_renderer = False
+
+
+class VectorPathPlanningWithLidar:
+    """
+    K 个智能体同时沿各自的路径前进, 每次 step 对所有 K x num_angle 条射线一次性求交.
+    各智能体可以共享同一张地图, 也可以各自使用不同的地图.
+    """
+    def __init__(self, maps, num_envs=None, max_range=20.0, scan_angle=128.0, num_angle=128):
+        """ Args:
+                maps (Map | list[Map]): 单张地图(复制 num_envs 份)或每个智能体一张地图.
+                num_envs (int): 智能体个数, maps 为列表时可省略.
+                max_range (float): 最大扫描距离(m).
+                scan_angle (float): 最大扫描角度(deg).
+                num_angle (int): 扫描角度个数.
+        """
+        if isinstance(maps, Map):
+            maps = [maps] * (1 if num_envs is None else num_envs)
+        maps = list(maps)
+        if num_envs is not None and len(maps) != num_envs:
+            raise ValueError(f"got {len(maps)} maps for {num_envs} envs")
+        self.maps = maps
+        self.num_envs = len(maps)
+        self.max_range = float(max_range)
+        self.scan_angle = float(scan_angle)
+        self.num_angle = int(num_angle)
+        self.ray_angles = np.deg2rad(np.linspace(-self.scan_angle/2, self.scan_angle/2, self.num_angle))
+
+        # 相同的地图只保留一份, groups[k] 为智能体 k 所用地图在 unique_maps 中的下标
+        self.unique_maps = []
+        self.groups = np.empty(self.num_envs, dtype=np.int64)
+        for k, m in enumerate(maps):
+            for g, u in enumerate(self.unique_maps):
+                if u is m:
+                    break
+            else:
+                g = len(self.unique_maps)
+                self.unique_maps.append(m)
+            self.groups[k] = g
+        self.positions = np.zeros((self.num_envs, 2))
+        self.yaws = np.full(self.num_envs, np.deg2rad(90.0))
+        self.set_paths([None] * self.num_envs)
+
+    def set_paths(self, paths):
+        """ 每个智能体的路径, 补齐为 (K, L, 2) 以便按下标批量取点, None 表示没有路径. """
+        if len(paths) != self.num_envs:
+            raise ValueError(f"got {len(paths)} paths for {self.num_envs} envs")
+        self.paths = list(paths)
+        self.path_lengths = np.array([0 if p is None else len(p) for p in paths], dtype=np.int64)
+        self.path_points = np.full((self.num_envs, max(1, self.path_lengths.max(initial=0)), 2), np.nan)
+        for k, p in enumerate(paths):
+            if p is not None and len(p):
+                self.path_points[k, :len(p)] = np.asarray(p, dtype=np.float64).reshape(-1, 2)
+        self.path_index = np.full(self.num_envs, -1, dtype=np.int64)
+
+    def reset(self):
+        self.positions[:] = [m.start for m in self.maps]
+        self.yaws[:] = np.deg2rad(90.0)
+        self.path_index[:] = -1
+        return self.positions.copy(), self.scan()
+
+    def step(self, actions=1):
+        """ 与 PathPlanningWithLidar.step 相同的语义, 对所有智能体同时执行.
+            Args:
+                actions (int | ndarray): (K,) 1: 前进, -1: 后退.
+            Returns:
+                dones (ndarray): (K,) bool.
+                observation: (positions (K, 2), scans (K, num_angle)).
+        """
+        self.path_index += np.broadcast_to(np.asarray(actions, dtype=np.int64), (self.num_envs,))
+        index = self.path_index
+        moving = (index >= 1) & (index < self.path_lengths)
+        dones = ~(moving | (index == 0))
+
+        k = np.flatnonzero(moving)
+        curr = self.path_points[k, index[k]]
+        prev = self.path_points[k, index[k] - 1]
+        self.positions[k] = curr
+        self.yaws[k] = np.arctan2(curr[:, 1] - prev[:, 1], curr[:, 0] - prev[:, 0])
+        return dones, (self.positions.copy(), self.scan())
+
+    def in_obstacle(self):
+        """ (K,) bool, 每张地图一次空间索引查询. """
+        inside = np.zeros(self.num_envs, dtype=bool)
+        for g, m in enumerate(self.unique_maps):
+            agents = np.flatnonzero(self.groups == g)
+            points = self.positions[agents]
+            # 成对的 (点, 候选障碍物)
+            point_idx, obstacle_idx = m.index.query(shapely.points(points))
+            if len(point_idx) == 0:
+                continue
+            hit = shapely.contains_xy(m.index.geometries[obstacle_idx], points[point_idx, 0], points[point_idx, 1])
+            inside[agents[point_idx[hit]]] = True
+        return inside
+
+    def scan(self):
+        """ Returns:
+                ndarray: (K, num_angle) float32, 未命中为 max_range, 位于障碍物内时全为 0.
+        """
+        angles = self.yaws[:, None] + self.ray_angles
+        directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+        origins = np.broadcast_to(self.positions[:, None, :], directions.shape)
+        edges = self.__nearby_edges(directions)
+        if instrument.enabled():
+            instrument.count("lidar.rays", self.num_envs * self.num_angle)
+            instrument.count("lidar.edges_tested", int(np.isfinite(edges[..., 0]).sum()))
+        with instrument.phase("lidar.intersect"):
+            distances = cast_ray_batches(origins, directions, edges, self.max_range)
+        ranges = np.minimum(distances, self.max_range).astype(np.float32)
+        ranges[self.in_obstacle()] = 0.0
+        return ranges
+
+    def __nearby_edges(self, directions):
+        """ 每个智能体扫描扇区包围盒内的障碍物边, 用 nan 补齐为 (K, E, 4). """
+        ends = self.positions[:, None, :] + self.max_range * directions
+        low = np.minimum(ends.min(axis=1), self.positions)
+        high = np.maximum(ends.max(axis=1), self.positions)
+        fans = shapely.box(low[:, 0], low[:, 1], high[:, 0], high[:, 1])
+
+        masks, groups = [], []
+        for g, m in enumerate(self.unique_maps):
+            agents = np.flatnonzero(self.groups == g)
+            # 成对的 (扇区, 候选障碍物) -> 每个扇区的边掩码
+            fan_idx, obstacle_idx = m.index.query(fans[agents])
+            selected = np.zeros((len(agents), len(m.obstacles)), dtype=bool)
+            selected[fan_idx, obstacle_idx] = True
+            masks.append(selected[:, m.edge_owners])
+            groups.append(agents)
+
+        num_edges = max(1, max(int(mask.sum(axis=1).max(initial=0)) for mask in masks))
+        edges = np.full((self.num_envs, num_edges, 4), np.nan)
+        for m, mask, agents in zip(self.unique_maps, masks, groups):
+            if mask.shape[1] == 0:
+                continue
+            # 稳定排序把选中的边排到前面, 超出各自边数的位置保持 nan
+            order = np.argsort(~mask, axis=1, kind='stable')[:, :num_edges]
+            keep = np.arange(order.shape[1]) < mask.sum(axis=1)[:, None]
+            edges[agents[:, None], np.arange(order.shape[1])] = np.where(keep[..., None], m.edges[order], np.nan)
+        return edges
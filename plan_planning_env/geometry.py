@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-20 10:02:13
+# Description: NumPy 批量几何计算 (射线求交等)
+import numpy as np
+import shapely
+
+# 单次批量计算允许的 (射线 x 线段) 元素个数, 超过则分块以限制内存
+_BLOCK_SIZE = 1 << 20
+# 端点判定容差, 避免射线正好穿过顶点时两条相邻边都被浮点误差排除
+_EPS = 1e-12
+
+
+def polygon_edges(polygons):
+    """ 将多边形的所有边(包含内环)展开为扁平的线段数组.
+        Args:
+            polygons (list[Polygon]): shapely 多边形.
+        Returns:
+            edges (ndarray): (E, 4), 每行为 [x1, y1, x2, y2].
+            owners (ndarray): (E,), 每条边所属多边形的下标.
+    """
+    segments = []
+    owners = []
+    for i, polygon in enumerate(polygons):
+        for ring in [polygon.exterior, *polygon.interiors]:
+            coords = np.asarray(ring.coords, dtype=np.float64)
+            if len(coords) < 2:
+                continue
+            segments.append(np.hstack([coords[:-1], coords[1:]]))
+            owners.append(np.full(len(coords) - 1, i, dtype=np.int64))
+    if not segments:
+        return np.empty((0, 4), dtype=np.float64), np.empty(0, dtype=np.int64)
+    return np.concatenate(segments), np.concatenate(owners)
+
+
+def cast_rays(origins, directions, edges, max_range):
+    """ 一次性求解所有射线与所有线段的最近交点.
+        Args:
+            origins (ndarray): (R, 2) 射线起点.
+            directions (ndarray): (R, 2) 单位方向向量.
+            edges (ndarray): (E, 4) 线段数组, 见 polygon_edges.
+            max_range (float): 最大距离(m).
+        Returns:
+            distances (ndarray): (R,), 未命中的射线为 inf.
+    """
+    origins = np.asarray(origins, dtype=np.float64)
+    directions = np.asarray(directions, dtype=np.float64)
+    num_rays = len(origins)
+    distances = np.full(num_rays, np.inf)
+    if num_rays == 0 or len(edges) == 0:
+        return distances
+
+    block = max(1, _BLOCK_SIZE // len(edges))
+    for lo in range(0, num_rays, block):
+        distances[lo:lo + block] = _nearest_hit(origins[lo:lo + block, None, :], directions[lo:lo + block, None, :],
+                                                edges[None, :, :], max_range)
+    return distances
+
+
+def cast_ray_batches(origins, directions, edges, max_range):
+    """ K 组射线分别与各自的线段集合求交, 所有 K x R 条射线一次计算.
+        Args:
+            origins (ndarray): (K, R, 2) 射线起点.
+            directions (ndarray): (K, R, 2) 单位方向向量.
+            edges (ndarray): (K, E, 4) 每组的线段, 不足 E 条的用 nan 填充.
+            max_range (float): 最大距离(m).
+        Returns:
+            distances (ndarray): (K, R), 未命中的射线为 inf.
+    """
+    origins = np.asarray(origins, dtype=np.float64)
+    directions = np.asarray(directions, dtype=np.float64)
+    num_groups, num_rays = origins.shape[:2]
+    distances = np.full((num_groups, num_rays), np.inf)
+    if num_groups == 0 or num_rays == 0 or edges.shape[1] == 0:
+        return distances
+
+    block = max(1, _BLOCK_SIZE // (num_rays * edges.shape[1]))
+    for lo in range(0, num_groups, block):
+        distances[lo:lo + block] = _nearest_hit(origins[lo:lo + block, :, None, :], directions[lo:lo + block, :, None, :],
+                                                edges[lo:lo + block, None, :, :], max_range)
+    return distances
+
+
+def _nearest_hit(p, r, edges, max_range):
+    """ 广播计算射线 p + t*r 与线段 q + u*s 的交点, 沿最后一维(线段)取最近. """
+    q = edges[..., :2]
+    s = edges[..., 2:] - q
+    with np.errstate(divide='ignore', invalid='ignore'):
+        qp = q - p
+        # 二维叉积: p + t*r = q + u*s
+        denom = r[..., 0] * s[..., 1] - r[..., 1] * s[..., 0]
+        t = (qp[..., 0] * s[..., 1] - qp[..., 1] * s[..., 0]) / denom
+        u = (qp[..., 0] * r[..., 1] - qp[..., 1] * r[..., 0]) / denom
+        # 平行线段(denom == 0)及 nan 填充的线段得到 inf/nan, 比较结果为 False 自动排除;
+        # 共线重叠的情况由相邻边在顶点处的交点给出
+        valid = (t >= 0) & (t <= max_range) & (u >= -_EPS) & (u <= 1 + _EPS)
+        return np.where(valid, t, np.inf).min(axis=-1)
+
+
+def rasterize_polygons(polygons, xs, ys):
+    """ 批量判断栅格点是否在多边形内部, 与逐点 polygon.contains(Point) 结果一致.
+        Args:
+            polygons (list[Polygon]): shapely 多边形.
+            xs (ndarray): (W,) 升序的栅格 x 坐标.
+            ys (ndarray): (H,) 升序的栅格 y 坐标.
+        Returns:
+            grid (ndarray): (W, H) int8, 1 为障碍物.
+    """
+    grid = np.zeros((len(xs), len(ys)), dtype=np.int8)
+    for polygon in polygons:
+        if polygon.is_empty:
+            continue
+        # 只测试多边形包围盒覆盖的子网格
+        min_x, min_y, max_x, max_y = polygon.bounds
+        i0, i1 = np.searchsorted(xs, min_x, side='left'), np.searchsorted(xs, max_x, side='right')
+        j0, j1 = np.searchsorted(ys, min_y, side='left'), np.searchsorted(ys, max_y, side='right')
+        if i0 >= i1 or j0 >= j1:
+            continue
+        shapely.prepare(polygon)
+        sub_x, sub_y = np.meshgrid(xs[i0:i1], ys[j0:j1], indexing='ij')
+        inside = shapely.contains_xy(polygon, sub_x, sub_y)
+        grid[i0:i1, j0:j1][inside] = 1
+    return grid
+
+
+
+def march_rays(grid, grid_origin, resolution, origin, directions, max_range, window=64):
+    """ 在占据栅格上对所有射线同时做 DDA (Amanatides-Woo) 遍历, 返回进入第一个占据栅格时的距离.
+        栅格 (i, j) 为以 grid_origin + (i, j) * resolution 为中心, 边长 resolution 的正方形, 地图外视为空闲.
+        射线穿过的 x/y 栅格边界距离是等差数列, 合并排序后相邻两个边界之间即依次经过的栅格.
+        按 window 个栅格长度分段推进, 已命中的射线不再参与后续分段.
+        Args:
+            grid (ndarray): (W, H) 占据栅格, 非 0 为障碍物.
+            grid_origin (array): 栅格 (0, 0) 中心的坐标.
+            resolution (float): 栅格边长(m).
+            origin (array): (2,) 射线起点.
+            directions (ndarray): (R, 2) 单位方向向量.
+            max_range (float): 最大距离(m).
+            window (int): 每段的长度(栅格数).
+        Returns:
+            distances (ndarray): (R,), 未命中的射线为 inf.
+    """
+    directions = np.asarray(directions, dtype=np.float64)
+    distances = np.full(len(directions), np.inf)
+    # 以栅格为单位的起点, 栅格 i 覆盖 [i, i + 1)
+    p = (np.asarray(origin, dtype=np.float64) - np.asarray(grid_origin, dtype=np.float64)) / resolution + 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 每个轴上第一个边界的距离及相邻边界的间隔, 平行于该轴的射线永远不会穿过边界
+        step = np.where(directions != 0, resolution / np.abs(directions), np.inf)
+        first = np.where(directions != 0, np.where(directions > 0, np.floor(p) + 1 - p, p - np.floor(p)) * step, np.inf)
+
+    active = np.arange(len(directions))
+    length = window * resolution
+    k = np.arange(window + 1)
+    lo = 0.0
+    while len(active) and lo < max_range:
+        hi = min(lo + length, max_range)
+        d, s, f = directions[active], step[active], first[active]
+        # 本段内的边界: 第 start 个边界起的 window + 1 个, 超出本段的截断为 hi
+        with np.errstate(invalid='ignore'):
+            start = np.maximum(np.ceil((lo - f) / s), 0)
+            start = np.where(np.isfinite(start), start, 0)
+            crossings = f[:, :, None] + (start[:, :, None] + k) * s[:, :, None]
+        crossings = crossings.reshape(len(active), -1)
+        bounds = np.full((len(active), 1), lo)
+        t = np.clip(np.sort(np.concatenate([bounds, crossings, bounds + (hi - lo)], axis=1), axis=1), lo, hi)
+
+        enter, leave = t[:, :-1], t[:, 1:]
+        mid = (enter + leave) / 2
+        i = np.floor(p[0] + mid * d[:, :1] / resolution).astype(np.int64)
+        j = np.floor(p[1] + mid * d[:, 1:] / resolution).astype(np.int64)
+        inside = (leave > enter) & (i >= 0) & (i < grid.shape[0]) & (j >= 0) & (j < grid.shape[1])
+        occupied = np.zeros(inside.shape, dtype=bool)
+        occupied[inside] = grid[i[inside], j[inside]] != 0
+
+        hit_at = np.argmax(occupied, axis=1)
+        rows = np.arange(len(active))
+        hit = occupied[rows, hit_at]
+        distances[active[hit]] = enter[rows[hit], hit_at[hit]]
+        active = active[~hit]
+        lo = hi
+    return distances
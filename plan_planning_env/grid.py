@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-23 16:05:31
+# Description: 展平栅格上的涟漪扩散与回溯
+import numpy as np
+
+# 8 邻域, 顺序与 WaveFront 原实现一致 (回溯时取第一个代价最小的邻居)
+DIRECTIONS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)], dtype=np.int64)
+
+
+class FlatGrid:
+    """
+    四周补一圈障碍物后展平的栅格. 邻居即固定的一维下标偏移, 扩散和回溯都不需要边界判断.
+    """
+    def __init__(self, grid):
+        """ Args:
+                grid (ndarray): (rows, cols) 占据栅格, 0 为可通行.
+        """
+        self.rows, self.cols = grid.shape
+        self.stride = self.cols + 2
+        padded = np.zeros((self.rows + 2, self.cols + 2), dtype=bool)
+        padded[1:-1, 1:-1] = grid == 0
+        self.free = padded.ravel()
+        self.offsets = DIRECTIONS[:, 0] * self.stride + DIRECTIONS[:, 1]
+
+    def to_flat(self, idx):
+        return (idx[0] + 1) * self.stride + idx[1] + 1
+
+    def to_idx(self, flat):
+        return int(flat // self.stride - 1), int(flat % self.stride - 1)
+
+    def unpad(self, field):
+        """ 展平的场 -> (rows, cols) 视图. """
+        return field.reshape(self.rows + 2, self.cols + 2)[1:-1, 1:-1]
+
+    def flood(self, source, stop=None):
+        """ 从 source 开始逐层(整圈)扩散, 每层一次数组运算.
+            Args:
+                source (int): 起点展平下标.
+                stop (int): 到达该下标所在的层后停止, None 表示扩散到所有可达栅格.
+            Returns:
+                wave (ndarray): 展平的步数场, 不可达为 -1.
+        """
+        wave = np.full(self.free.size, -1, dtype=np.int32)
+        wave[source] = 0
+        frontier = np.array([source], dtype=np.int64)
+        depth = 0
+        while frontier.size and (stop is None or wave[stop] < 0):
+            depth += 1
+            candidates = (frontier[:, None] + self.offsets).ravel()
+            candidates = candidates[self.free[candidates] & (wave[candidates] < 0)]
+            frontier = np.unique(candidates)
+            wave[frontier] = depth
+        return wave
+
+    def descend(self, wave, start):
+        """ 沿步数场从 start 下降到 0, 返回经过的展平下标(包含两端). """
+        path = [start]
+        curr = start
+        while wave[curr] > 0:
+            values = wave[curr + self.offsets]
+            values = np.where(values >= 0, values, np.iinfo(np.int32).max)
+            k = int(np.argmin(values))
+            if values[k] >= wave[curr]:
+                break  # 死循环保护
+            curr = curr + self.offsets[k]
+            path.append(curr)
+        return path
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-07-03 10:12:44
+# Description: 可选的分阶段计时与计数. 未启用时 phase()/count() 只有一次全局变量判断
+#
+#   with instrument.collect() as metrics:
+#       path = WaveFront(custom_map).plan()
+#   metrics.record()  # {"phases": {"grid.rasterize": {"total_s": ..., "calls": 1}, ...}, "counters": {...}}
+import time
+from contextlib import contextmanager
+
+# 当前正在收集的 Metrics, None 表示未启用
+_active = None
+
+
+class Metrics:
+    def __init__(self):
+        self.phases = {}    # name -> [累计耗时(s), 调用次数]
+        self.counters = {}  # name -> 累计值
+
+    def add_time(self, name, elapsed):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [elapsed, 1]
+        else:
+            entry[0] += elapsed
+            entry[1] += 1
+
+    def add_count(self, name, n):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        for name, (elapsed, calls) in other.phases.items():
+            entry = self.phases.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += calls
+        for name, n in other.counters.items():
+            self.add_count(name, n)
+
+    @classmethod
+    def from_record(cls, record):
+        """ record() 的逆操作, 例如合并子进程返回的指标. """
+        metrics = cls()
+        metrics.phases = {name: [entry["total_s"], entry["calls"]] for name, entry in record["phases"].items()}
+        metrics.counters = dict(record["counters"])
+        return metrics
+
+    def record(self):
+        """ 可直接 pickle/json 的 dict. """
+        return {
+            "phases": {name: {"total_s": elapsed, "calls": calls} for name, (elapsed, calls) in self.phases.items()},
+            "counters": {name: int(n) for name, n in self.counters.items()},
+        }
+
+
+class _Phase:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullPhase()
+
+
+def enabled():
+    return _active is not None
+
+
+def phase(name):
+    """ 计时上下文: with phase("wavefront.flood"): ... """
+    if _active is None:
+        return _NULL
+    return _Phase(_active, name)
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.add_count(name, n)
+
+
+@contextmanager
+def collect(metrics=None):
+    """ 在 with 块内启用收集. 可以嵌套, 内层结束后其结果也计入外层. """
+    global _active
+    outer = _active
+    metrics = Metrics() if metrics is None else metrics
+    _active = metrics
+    try:
+        yield metrics
+    finally:
+        _active = outer
+        if outer is not None:
+            outer.merge(metrics)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-29 10:42:18
+# Description: 不依赖 transformers 的推理模型, 可由 LidarPathTransformer 的权重转换得到, 支持 TorchScript/ONNX 导出
+import re
+
+import torch
+from torch import nn
+
+
+def _encoder(hidden_size, num_heads, num_layers):
+    # 与 BertLayer 等价: post-norm, gelu(erf), LayerNorm eps 1e-12; 推理时不需要 dropout
+    layer = nn.TransformerEncoderLayer(hidden_size, num_heads, dim_feedforward=hidden_size * 4, dropout=0.0,
+                                       activation='gelu', layer_norm_eps=1e-12, batch_first=True, norm_first=False)
+    return nn.TransformerEncoder(layer, num_layers, enable_nested_tensor=False)
+
+
+class LiteLidarPathTransformer(nn.Module):
+    """
+    LidarPathTransformer 的精简版: 去掉 BERT 中用不到的词表/位置/类型 embedding,
+    序列长度为 1 时它们只贡献一个常量偏置 embedding_bias.
+    输入输出与 LidarPathTransformer 相同.
+    """
+    def __init__(self, lidar_dim, use_pos=True, hidden_size=128, num_heads=4, num_layers=2):
+        super().__init__()
+        self.use_pos = use_pos
+        self.lidar_dim = lidar_dim
+        self.input_dim = lidar_dim + (2 if use_pos else 0)
+        self.input_fc = nn.Linear(self.input_dim, hidden_size)
+        # position_embeddings[0] + token_type_embeddings[0]
+        self.embedding_bias = nn.Parameter(torch.zeros(hidden_size))
+        self.embedding_norm = nn.LayerNorm(hidden_size, eps=1e-12)
+        self.encoder = _encoder(hidden_size, num_heads, num_layers)
+        self.output_fc = nn.Linear(hidden_size, 2)  # 输出 dx, dy
+
+    def forward(self, lidar_scan, current_pos=None):
+        """
+        lidar_scan: (batch, lidar_dim)
+        current_pos: (batch, 2) or None
+        """
+        if self.use_pos and current_pos is not None:
+            x = torch.cat([lidar_scan, current_pos], dim=-1)
+        else:
+            x = lidar_scan
+        x = self.embedding_norm(self.input_fc(x) + self.embedding_bias).unsqueeze(1)  # (batch, 1, hidden_size)
+        x = self.encoder(x)
+        return self.output_fc(x[:, 0, :])
+
+    @classmethod
+    def from_bert_state_dict(cls, state_dict, use_pos=True, num_heads=4):
+        """ 由 LidarPathTransformer 的 state_dict 构建, 不需要导入 transformers.
+            Args:
+                state_dict (dict): LidarPathTransformer.state_dict() 或 torch.load 读入的同名权重.
+                use_pos (bool): 与原模型一致.
+                num_heads (int): 原模型的注意力头数.
+        """
+        hidden_size, input_dim = state_dict["input_fc.weight"].shape
+        lidar_dim = input_dim - (2 if use_pos else 0)
+        num_layers = 1 + max(int(m.group(1)) for key in state_dict
+                             for m in [re.match(r"bert\.encoder\.layer\.(\d+)\.", key)] if m)
+        model = cls(lidar_dim, use_pos=use_pos, hidden_size=hidden_size, num_heads=num_heads, num_layers=num_layers)
+
+        weights = {
+            "input_fc.weight": state_dict["input_fc.weight"],
+            "input_fc.bias": state_dict["input_fc.bias"],
+            "output_fc.weight": state_dict["output_fc.weight"],
+            "output_fc.bias": state_dict["output_fc.bias"],
+            "embedding_bias": state_dict["bert.embeddings.position_embeddings.weight"][0]
+                              + state_dict["bert.embeddings.token_type_embeddings.weight"][0],
+            "embedding_norm.weight": state_dict["bert.embeddings.LayerNorm.weight"],
+            "embedding_norm.bias": state_dict["bert.embeddings.LayerNorm.bias"],
+        }
+        for i in range(num_layers):
+            src = f"bert.encoder.layer.{i}."
+            dst = f"encoder.layers.{i}."
+            for suffix in ("weight", "bias"):
+                weights[dst + "self_attn.in_proj_" + suffix] = torch.cat(
+                    [state_dict[src + f"attention.self.{name}.{suffix}"] for name in ("query", "key", "value")])
+                weights[dst + "self_attn.out_proj." + suffix] = state_dict[src + "attention.output.dense." + suffix]
+                weights[dst + "norm1." + suffix] = state_dict[src + "attention.output.LayerNorm." + suffix]
+                weights[dst + "linear1." + suffix] = state_dict[src + "intermediate.dense." + suffix]
+                weights[dst + "linear2." + suffix] = state_dict[src + "output.dense." + suffix]
+                weights[dst + "norm2." + suffix] = state_dict[src + "output.LayerNorm." + suffix]
+        model.load_state_dict(weights)
+        return model.eval()
+
+
+class RayTokenTransformer(nn.Module):
+    """
+    每 group_size 条相邻射线作为一个 token, 加上位置 token 和汇总用的 [CLS] token,
+    自注意力在射线组之间进行. 输入输出与 LidarPathTransformer 相同, 需要单独训练.
+    """
+    def __init__(self, lidar_dim, use_pos=True, hidden_size=128, num_heads=4, num_layers=2, group_size=8):
+        super().__init__()
+        self.use_pos = use_pos
+        self.lidar_dim = lidar_dim
+        self.group_size = group_size
+        self.num_groups = -(-lidar_dim // group_size)
+        # 射线数不能整除时末尾补 0
+        self.pad = self.num_groups * group_size - lidar_dim
+        self.ray_fc = nn.Linear(group_size, hidden_size)
+        self.pos_fc = nn.Linear(2, hidden_size)
+        self.cls_token = nn.Parameter(torch.zeros(1, 1, hidden_size))
+        self.position_embeddings = nn.Parameter(torch.zeros(1, self.num_groups + 2, hidden_size))
+        nn.init.normal_(self.cls_token, std=0.02)
+        nn.init.normal_(self.position_embeddings, std=0.02)
+        self.embedding_norm = nn.LayerNorm(hidden_size, eps=1e-12)
+        self.encoder = _encoder(hidden_size, num_heads, num_layers)
+        self.output_fc = nn.Linear(hidden_size, 2)  # 输出 dx, dy
+
+    def forward(self, lidar_scan, current_pos=None):
+        """
+        lidar_scan: (batch, lidar_dim)
+        current_pos: (batch, 2) or None
+        """
+        batch = lidar_scan.shape[0]
+        if self.pad:
+            lidar_scan = nn.functional.pad(lidar_scan, (0, self.pad))
+        # 输入可能不连续(例如切片), 用 reshape 而不是 view
+        rays = self.ray_fc(lidar_scan.reshape(batch, self.num_groups, self.group_size))  # (batch, num_groups, hidden)
+        if self.use_pos and current_pos is not None:
+            pos = self.pos_fc(current_pos).unsqueeze(1)
+        else:
+            pos = torch.zeros_like(rays[:, :1])
+        x = torch.cat([self.cls_token.expand(batch, -1, -1), pos, rays], dim=1)
+        x = self.encoder(self.embedding_norm(x + self.position_embeddings))
+        return self.output_fc(x[:, 0, :])
+
+
+def _example_inputs(model, batch_size=1):
+    return torch.zeros(batch_size, model.lidar_dim), torch.zeros(batch_size, 2)
+
+
+def export_torchscript(model, path):
+    """ 以 trace 方式导出 TorchScript, 加载时只需要 torch.jit.load. """
+    model = model.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(model, _example_inputs(model, batch_size=2))
+    traced.save(path)
+    return traced
+
+
+def export_onnx(model, path, opset_version=17):
+    """ 导出 ONNX, batch 维为动态维度. """
+    model = model.eval()
+    with torch.no_grad():
+        torch.onnx.export(model, _example_inputs(model, batch_size=2), path,
+                          input_names=["lidar_scan", "current_pos"], output_names=["delta"],
+                          dynamic_axes={"lidar_scan": {0: "batch"}, "current_pos": {0: "batch"}, "delta": {0: "batch"}},
+                          opset_version=opset_version)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-07-05 11:03:47
+# Description: 批量生成可达的随机起终点. 在膨胀后的占据栅格上预先求连通分量, 只保留起终点位于同一连通分量的样本,
+#   生成的 run 都能被 WaveFront 规划出路径. 不依赖 GUI, 也可以命令行为已有地图补充 run.
+import argparse
+
+import numpy as np
+import shapely
+from scipy import ndimage
+
+from . import instrument
+from .dataset import DEFAULT_MAP_SIZE, PathDataset, list_sources, load_maps, save_pickle
+from .env import Map
+from .solutions import GridPlanner
+
+
+class StartEndSampler:
+    """
+    使用与栅格规划器相同的膨胀栅格(相同的 grid_resolution/safe_margin/cache),
+    8 邻域连通分量与 WaveFront 的扩散一致.
+    """
+    def __init__(self, Map, grid_resolution=0.1, safe_margin=0.2, cache=None, grid=None, seed=None):
+        """ Args:
+                cache (OccupancyGridCache): 栅格缓存, 与规划器共用时同一地图只栅格化一次.
+                grid (ndarray): 已生成的膨胀栅格, 给定时跳过栅格化.
+                seed (int): 随机数种子, None 表示不固定.
+        """
+        self.map = Map
+        occupancy = GridPlanner(Map, grid_resolution, safe_margin, cache, grid)
+        self.grid, self.ox, self.oy = occupancy.grid, occupancy.ox, occupancy.oy
+        self.grid_resolution = grid_resolution
+        self.rng = np.random.default_rng(seed)
+        with instrument.phase("sampling.label"):
+            # 障碍物栅格标号为 0, 自由栅格为所在连通分量的编号 1..num_components
+            self.labels, self.num_components = ndimage.label(self.grid == 0, structure=np.ones((3, 3), dtype=bool))
+
+    def components(self, points):
+        """ 批量查询点所在的连通分量.
+            Args:
+                points (ndarray): (N, 2) 坐标.
+            Returns:
+                ndarray: (N,) 连通分量编号, 位于障碍物内(含安全距离)或地图外为 0.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        # 与 pos_to_idx 相同的取整
+        ix = np.round((points[:, 0] - self.ox[0]) / self.grid_resolution).astype(np.int64)
+        iy = np.round((points[:, 1] - self.oy[0]) / self.grid_resolution).astype(np.int64)
+        inside = (ix >= 0) & (ix < self.grid.shape[0]) & (iy >= 0) & (iy < self.grid.shape[1])
+        labels = np.zeros(len(points), dtype=self.labels.dtype)
+        labels[inside] = self.labels[ix[inside], iy[inside]]
+        # safe_margin 小于半个栅格时栅格点可能漏掉障碍物边缘, 再按原始多边形精确判断
+        hits = self.map.index.query(shapely.points(points[labels > 0]), predicate='intersects')[0]
+        labels[np.flatnonzero(labels > 0)[hits]] = 0
+        return labels
+
+    def sample(self, n, min_dist=10.0, batch_size=1024, max_batches=100):
+        """ 成批采样候选起终点, 只保留都在自由空间, 位于同一连通分量且距离大于 min_dist 的配对.
+            Args:
+                n (int): 起终点对个数.
+                min_dist (float): 起终点的最小直线距离(m).
+                batch_size (int): 每批候选对的个数.
+                max_batches (int): 最多采样的批数, 超过仍不足 n 对时报错.
+            Returns:
+                list: [[(start_x, start_y), (end_x, end_y)], ...]
+        """
+        (min_x, min_y), (max_x, max_y) = self.map.size
+        low, high = np.array([min_x, min_y]), np.array([max_x, max_y])
+        pairs = []
+        for _ in range(max_batches):
+            if len(pairs) >= n:
+                break
+            starts = self.rng.uniform(low, high, (batch_size, 2))
+            ends = self.rng.uniform(low, high, (batch_size, 2))
+            with instrument.phase("sampling.containment"):
+                labels = self.components(np.concatenate([starts, ends]))
+            start_labels, end_labels = labels[:batch_size], labels[batch_size:]
+            valid = ((start_labels > 0) & (start_labels == end_labels)
+                     & (np.linalg.norm(starts - ends, axis=1) > min_dist))
+            instrument.count("sampling.candidates", batch_size)
+            instrument.count("sampling.accepted", int(np.count_nonzero(valid)))
+            pairs += [[tuple(s), tuple(e)] for s, e in zip(starts[valid].tolist(), ends[valid].tolist())]
+        if len(pairs) < n:
+            raise RuntimeError(f"cant find {n} reachable start/end pairs farther than {min_dist} "
+                               f"after {max_batches * batch_size} candidates, found {len(pairs)}")
+        return pairs[:n]
+
+
+def random_start_end(obstacles, n, min_dist=10.0, map_size=DEFAULT_MAP_SIZE, seed=None, **kwargs):
+    """ 为一张地图生成 n 对可达的起终点, 参数见 StartEndSampler.
+        Args:
+            obstacles (list): 障碍物顶点列表, 与 Map 相同.
+    """
+    sampler = StartEndSampler(Map(obstacles, map_size=map_size), seed=seed, **kwargs)
+    return sampler.sample(n, min_dist)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generate reachable start/end runs for maps without a GUI")
+    parser.add_argument("paths", nargs="+", help="pkl/npz files or directories containing them")
+    parser.add_argument("--runs", type=int, default=20, help="runs per map")
+    parser.add_argument("--min-dist", type=float, default=10.0)
+    parser.add_argument("--grid-resolution", type=float, default=0.1)
+    parser.add_argument("--safe-margin", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--replace", action="store_true", help="also replace the runs of maps that already have runs")
+    args = parser.parse_args()
+
+    files = list_sources(args.paths)
+    rng = np.random.default_rng(args.seed)
+    for file in files:
+        # 需要整体写回, 读入文件中的所有地图
+        maps = list(load_maps(file))
+        changed = 0
+        for name, data in maps:
+            if data.get("runs") and not args.replace:
+                continue
+            sampler = StartEndSampler(Map(data.get("obstacles", []), map_size=data.get("map_size", DEFAULT_MAP_SIZE)),
+                                      args.grid_resolution, args.safe_margin, seed=rng)
+            data["runs"] = [{"start": start, "end": end} for start, end in sampler.sample(args.runs, args.min_dist)]
+            changed += 1
+            print(f"{file}:{name}: {sampler.num_components} free components, {args.runs} runs")
+        if not changed:
+            continue
+        if file.endswith(".npz"):
+            PathDataset.from_maps([data for _, data in maps], [name for name, _ in maps]).save(file)
+        else:
+            save_pickle(maps[0][1], file)
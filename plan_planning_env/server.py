@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-07-01 09:36:27
+# Description: 本地规划服务. 每行一个 JSON 请求/响应, 监听 TCP 或 Unix socket
+#
+#   请求: {"id": 1, "map_id": "1", "start": [x, y], "goal": [x, y], "planner": "wavefront"}
+#   响应: {"id": 1, "path": [[x, y], ...] | null, "cached": false}  出错时为 {"id": 1, "error": "..."}
+import argparse
+import asyncio
+import json
+import os
+import socket
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .cache import OccupancyGridCache
+from .dataset import load_maps, list_sources, DEFAULT_MAP_SIZE
+from .env import Map
+from .solutions import RRT, RRTStar, WaveFront, AStar, JPS
+
+GRID_PLANNERS = {"wavefront": WaveFront, "astar": AStar, "jps": JPS}
+SAMPLING_PLANNERS = {"rrt": RRT, "rrtstar": RRTStar}
+PLANNERS = tuple(GRID_PLANNERS) + tuple(SAMPLING_PLANNERS)
+
+
+# ---------------------------------------------------------------------- 工作进程
+# 每个工作进程常驻的地图描述, 共享内存中的栅格, 以及按 (map_id, planner) 复用的规划器
+_specs = {}
+_shms = []
+_maps = {}
+_planners = {}
+
+
+def _init_worker(specs):
+    for map_id, spec in specs.items():
+        shm = shared_memory.SharedMemory(name=spec["grid_name"])
+        grid = np.ndarray(spec["grid_shape"], dtype=np.int8, buffer=shm.buf)
+        grid.flags.writeable = False
+        _shms.append(shm)
+        _specs[map_id] = dict(spec, grid=grid)
+
+
+def _map(map_id):
+    if map_id not in _maps:
+        spec = _specs[map_id]
+        _maps[map_id] = Map(spec["obstacles"], map_size=spec["map_size"])
+    return _maps[map_id]
+
+
+def _grid_planner(map_id, planner):
+    key = (map_id, planner)
+    if key not in _planners:
+        spec = _specs[map_id]
+        _planners[key] = GRID_PLANNERS[planner](_map(map_id), spec["grid_resolution"], spec["safe_margin"],
+                                                grid=spec["grid"])
+    return _planners[key]
+
+
+def _to_list(path):
+    return None if path is None else np.asarray(path, dtype=np.float64).tolist()
+
+
+def _plan_many(map_id, goal, starts):
+    """ 终点相同的一批起点, 只扩散一次. WaveFront 实例按终点缓存步数场, 同一终点的后续批次直接回溯. """
+    wf = _grid_planner(map_id, "wavefront")
+    return [_to_list(path) for path in wf.plan_many(starts, end=goal)]
+
+
+def _plan_one(map_id, planner, start, goal):
+    if planner in GRID_PLANNERS:
+        solver = _grid_planner(map_id, planner)
+        solver.start, solver.end = np.array(start, dtype=np.float64), np.array(goal, dtype=np.float64)
+    else:
+        # 采样规划器的树与起点绑定, 每次新建, 但复用地图的空间索引
+        m = _map(map_id)
+        m.start, m.end = start, goal
+        solver = SAMPLING_PLANNERS[planner](m)
+    return _to_list(solver.plan())
+
+
+# ---------------------------------------------------------------------- 服务
+class PlanningServer:
+    """
+    地图和膨胀后的占据栅格在启动时一次性建好, 栅格放在共享内存中供所有工作进程只读使用.
+    - 同一地图同一终点的 wavefront 请求在 batch_window 内合并为一次完整扩散 (WaveFront.plan_many);
+    - 完全相同的请求在计算中时只计算一次;
+    - 最近的结果按 LRU 缓存, 栅格规划器的键按栅格下标取整.
+    """
+    def __init__(self, maps, workers=None, cache_size=4096, batch_window=0.002,
+                 grid_resolution=0.1, safe_margin=0.2, grid_cache=None):
+        """ Args:
+                maps (dict): map_id -> 旧格式 dict ({"obstacles": [...], "map_size": ...}).
+                workers (int): 工作进程数, 默认 CPU 核数.
+                cache_size (int): 缓存的结果个数.
+                batch_window (float): 合并同一终点请求的等待时间(s).
+                grid_cache (OccupancyGridCache): 建栅格时使用的缓存, 可指定磁盘目录复用之前的栅格.
+        """
+        self.workers = workers or os.cpu_count()
+        self.cache_size = int(cache_size)
+        self.batch_window = float(batch_window)
+        self.grid_resolution = grid_resolution
+        self.safe_margin = safe_margin
+        grid_cache = grid_cache or OccupancyGridCache()
+
+        self.specs = {}
+        self.__shms = []
+        try:
+            for map_id, data in maps.items():
+                map_size = data.get("map_size") or DEFAULT_MAP_SIZE
+                obstacles = [np.asarray(obs, dtype=np.float64).tolist() for obs in data.get("obstacles", [])]
+                grid = WaveFront(Map(obstacles, map_size=map_size), grid_resolution, safe_margin, cache=grid_cache).grid
+                shm = shared_memory.SharedMemory(create=True, size=max(grid.nbytes, 1))
+                self.__shms.append(shm)
+                np.ndarray(grid.shape, dtype=np.int8, buffer=shm.buf)[:] = grid
+                self.specs[str(map_id)] = {
+                    "obstacles": obstacles,
+                    "map_size": map_size,
+                    "grid_resolution": grid_resolution,
+                    "safe_margin": safe_margin,
+                    "grid_name": shm.name,
+                    "grid_shape": grid.shape,
+                }
+        except BaseException:
+            self.close()
+            raise
+        self.pool = None
+
+        self.results = OrderedDict()
+        self.__inflight = {}
+        self.__batches = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "floods": 0, "jobs": 0}
+
+    def start(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.specs,))
+
+    def close(self):
+        if getattr(self, "pool", None) is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+        for shm in self.__shms:
+            shm.close()
+            shm.unlink()
+        self.__shms = []
+
+    def __cell(self, spec, pos):
+        origin = np.asarray(spec["map_size"][0], dtype=np.float64)
+        return tuple(np.round((np.asarray(pos, dtype=np.float64) - origin) / spec["grid_resolution"]).astype(int).tolist())
+
+    def __remember(self, key, path):
+        self.results[key] = path
+        self.results.move_to_end(key)
+        while len(self.results) > self.cache_size:
+            self.results.popitem(last=False)
+
+    async def plan(self, map_id, start, goal, planner="wavefront"):
+        """ Returns:
+                (path, cached): path 为 [[x, y], ...] 或 None.
+        """
+        map_id = str(map_id)
+        if map_id not in self.specs:
+            raise KeyError(f"unknown map_id: {map_id}")
+        if planner not in PLANNERS:
+            raise ValueError(f"unknown planner: {planner}, expected one of {PLANNERS}")
+        spec = self.specs[map_id]
+        start = [float(v) for v in start]
+        goal = [float(v) for v in goal]
+        self.stats["requests"] += 1
+
+        if planner in GRID_PLANNERS:
+            key = (map_id, planner, self.__cell(spec, start), self.__cell(spec, goal))
+        else:
+            key = (map_id, planner, tuple(start), tuple(goal))
+        if key in self.results:
+            self.stats["cache_hits"] += 1
+            self.results.move_to_end(key)
+            return self.results[key], True
+        if key in self.__inflight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.__inflight[key]), False
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__inflight[key] = future
+        try:
+            if planner == "wavefront":
+                batch_key = (map_id, key[3])
+                if batch_key not in self.__batches:
+                    self.__batches[batch_key] = (goal, [])
+                    loop.call_later(self.batch_window, self.__flush, batch_key)
+                else:
+                    self.stats["coalesced"] += 1
+                self.__batches[batch_key][1].append((start, future))
+            else:
+                self.stats["jobs"] += 1
+                job = loop.run_in_executor(self.pool, _plan_one, map_id, planner, start, goal)
+                job.add_done_callback(lambda job: self.__resolve(future, job))
+            path = await asyncio.shield(future)
+        finally:
+            self.__inflight.pop(key, None)
+        self.__remember(key, path)
+        return path, False
+
+    def __flush(self, batch_key):
+        goal, requests = self.__batches.pop(batch_key)
+        self.stats["floods"] += 1
+        job = asyncio.get_running_loop().run_in_executor(self.pool, _plan_many, batch_key[0], goal,
+                                                         [start for start, _ in requests])
+
+        def done(job):
+            if job.exception() is not None:
+                for _, future in requests:
+                    self.__resolve(future, job)
+                return
+            for (_, future), path in zip(requests, job.result()):
+                if not future.done():
+                    future.set_result(path)
+        job.add_done_callback(done)
+
+    @staticmethod
+    def __resolve(future, job):
+        if future.done():
+            return
+        if job.cancelled():
+            future.cancel()
+        elif job.exception() is not None:
+            future.set_exception(job.exception())
+        else:
+            future.set_result(job.result())
+
+    async def handle(self, reader, writer):
+        """ 一个连接上的请求并发处理, 响应按完成顺序写回, 用 id 对应. """
+        tasks = set()
+
+        async def respond(request):
+            response = {"id": request.get("id")}
+            try:
+                path, cached = await self.plan(request["map_id"], request["start"], request["goal"],
+                                               request.get("planner", "wavefront"))
+                response.update(path=path, cached=cached)
+            except Exception as e:
+                response["error"] = f"{type(e).__name__}: {e}"
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    writer.write((json.dumps({"id": None, "error": f"JSONDecodeError: {e}"}) + "\n").encode())
+                    continue
+                if request.get("stats"):
+                    writer.write((json.dumps({"id": request.get("id"), "stats": self.stats}) + "\n").encode())
+                    continue
+                task = asyncio.ensure_future(respond(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_path=None):
+        self.start()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class PlanningClient:
+    """
+    同步客户端, 一个连接上顺序发送请求. 仿真进程各自持有一个即可.
+    """
+    def __init__(self, address):
+        """ Args:
+                address: (host, port) 或 Unix socket 路径.
+        """
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.file = self.sock.makefile("rwb")
+        self.__id = 0
+
+    def request(self, payload):
+        self.__id += 1
+        self.file.write((json.dumps(dict(payload, id=self.__id)) + "\n").encode())
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def plan(self, map_id, start, goal, planner="wavefront"):
+        path = self.request({"map_id": map_id, "start": list(map(float, start)), "goal": list(map(float, goal)),
+                             "planner": planner})["path"]
+        return None if path is None else np.asarray(path)
+
+    def stats(self):
+        return self.request({"stats": True})["stats"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve path planning requests over TCP or a Unix socket")
+    parser.add_argument("sources", nargs="+", help=".pkl/.npz files or directories containing them")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-size", type=int, default=4096)
+    parser.add_argument("--batch-window", type=float, default=0.002, help="seconds to wait for same-goal requests")
+    parser.add_argument("--grid-cache", default="./dataset/grids", help="on-disk occupancy grid cache, '' to disable")
+    args = parser.parse_args()
+
+    maps = {}
+    for file in list_sources(args.sources):
+        for name, data in load_maps(file):
+            maps[str(name)] = data
+
+    server = PlanningServer(maps, workers=args.workers, cache_size=args.cache_size, batch_window=args.batch_window,
+                            grid_cache=OccupancyGridCache(cache_dir=args.grid_cache or None))
+    print(f"serving {len(maps)} maps on {args.unix or f'{args.host}:{args.port}'}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
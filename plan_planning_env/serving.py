@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-30 15:08:52
+# Description: 纯 CPU 部署: 动态 int8 量化, 线程数设置, 以及 fp32/int8 的延迟和精度对比
+import argparse
+import copy
+import io
+import os
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from .dataset import DEFAULT_MAP_SIZE, PathDataset, list_sources, load_maps
+from .env import Map, PathPlanningWithLidar
+from .lite import LiteLidarPathTransformer
+from .trajectories import replay
+
+
+def configure_threads(num_threads=None, num_interop_threads=None):
+    """ 设置 intra-op / inter-op 线程数. 多进程部署时每个进程一般设为 1, 由进程数占满所有核.
+        inter-op 线程数只能在第一次并行计算之前设置一次.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads is not None:
+        torch.set_num_interop_threads(num_interop_threads)
+
+
+class _WithoutFastPath(nn.Module):
+    """
+    推理时关闭 nn.TransformerEncoderLayer 的 fast path: 它读取 linear1.weight.device,
+    而量化后的 DynamicQuantizedLinear.weight 是方法, 会抛出 AttributeError.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.lidar_dim = model.lidar_dim
+        self.use_pos = model.use_pos
+
+    def forward(self, lidar_scan, current_pos=None):
+        enabled = torch.backends.mha.get_fastpath_enabled()
+        torch.backends.mha.set_fastpath_enabled(False)
+        try:
+            return self.model(lidar_scan, current_pos)
+        finally:
+            torch.backends.mha.set_fastpath_enabled(enabled)
+
+
+def quantize(model):
+    """ 对所有 nn.Linear 做动态 int8 量化(权重 int8, 激活在运行时量化), 返回新模型, 原模型不变.
+        注意力中的 out_proj 是 NonDynamicallyQuantizableLinear, 保持 fp32.
+        返回的模型推理时关闭编码器的 fast path, 见 _WithoutFastPath.
+    """
+    model = copy.deepcopy(model).eval()
+    return _WithoutFastPath(torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)).eval()
+
+
+def cpu_model(model, int8=True, num_threads=None, num_interop_threads=None):
+    """ 准备 CPU 推理模型: 设置线程数, 可选量化. 返回 eval 模式的模型, 可直接交给 PathPredictor. """
+    configure_threads(num_threads, num_interop_threads)
+    model = model.to('cpu').eval()
+    return quantize(model) if int8 else model
+
+
+def model_bytes(model):
+    """ 序列化后的 state_dict 大小. """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def rss_bytes():
+    """ 当前进程的常驻内存, 仅 Linux. """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def _maps_from(files, datasets, first):
+    """ 按顺序从第 first 张地图开始产生旧格式 dict, 之前的地图不做转换. """
+    k = 0
+    for file in files:
+        if file in datasets:
+            dataset = datasets[file]
+            for m in range(max(first - k, 0), dataset.num_maps):
+                yield dataset.map_dict(m)
+            k += dataset.num_maps
+        else:
+            if k >= first:
+                yield from (data for _, data in load_maps(file))
+            k += 1
+
+
+def held_out_samples(trains_path, fraction=0.2, max_samples=None):
+    """ 把 trains_path 下按文件名排序的最后 fraction 张地图作为验证集, 回放出 (scans, positions, targets). """
+    files = list_sources(trains_path)
+    datasets = {file: PathDataset.load(file) for file in files if file.endswith('.npz')}
+    num_maps = sum(datasets[file].num_maps if file in datasets else 1 for file in files)
+    scans, positions, targets = [], [], []
+    for data in _maps_from(files, datasets, num_maps - max(1, int(round(num_maps * fraction)))):
+        if max_samples is not None and len(scans) >= max_samples:
+            break
+        for run in data.get("runs", []):
+            path = run.get("path")
+            if path is None or len(path) < 2:
+                continue
+            path = [np.asarray(p, dtype=np.float64) for p in path]
+            env = PathPlanningWithLidar(Map(data["obstacles"], start=path[0], end=path[-1],
+                                            map_size=data.get("map_size", DEFAULT_MAP_SIZE)), observation='ranges')
+            for scan, pos, target in replay(env, path):
+                scans.append(scan.copy())
+                positions.append(pos)
+                targets.append(target)
+            if max_samples is not None and len(scans) >= max_samples:
+                break
+    scans, positions, targets = (np.asarray(a, dtype=np.float32)[:max_samples] for a in (scans, positions, targets))
+    return scans, positions, targets
+
+
+def bert_parity(state_dict, lite, use_pos=True, batch_size=16, seed=0):
+    """ 用 transformers 的 LidarPathTransformer 加载同一份权重, 在随机输入上与转换得到的 lite 模型比较.
+        Returns:
+            float: 输出的最大绝对误差, 未安装 transformers 时为 None.
+    """
+    try:
+        from .transformer import LidarPathTransformer
+    except ImportError:
+        return None
+    bert = LidarPathTransformer(lite.lidar_dim, use_pos=use_pos, hidden_size=state_dict["input_fc.weight"].shape[0])
+    # 不同 transformers 版本的 position_ids buffer 可能不在 state_dict 中, 只要求权重齐全
+    missing, unexpected = bert.load_state_dict(state_dict, strict=False)
+    missing = [key for key in missing if not key.endswith("position_ids")]
+    if missing or unexpected:
+        raise ValueError(f"state_dict does not match LidarPathTransformer: missing {missing}, unexpected {unexpected}")
+    bert.eval()
+    generator = torch.Generator().manual_seed(seed)
+    scans = torch.rand(batch_size, lite.lidar_dim, generator=generator) * 20.0
+    positions = torch.randn(batch_size, 2, generator=generator) * 5.0
+    with torch.inference_mode():
+        return float((bert(scans, positions) - lite.eval()(scans, positions)).abs().max())
+
+
+def benchmark(model, scans, positions, batch_size=1, repeat=3):
+    """ 逐 batch 推理所有样本.
+        Returns:
+            predictions (ndarray): (N, 2).
+            latencies (ndarray): 每个 batch 的耗时(s).
+    """
+    scans = torch.from_numpy(scans)
+    positions = torch.from_numpy(positions)
+    predictions = np.empty((len(scans), 2), dtype=np.float32)
+    latencies = []
+    with torch.inference_mode():
+        model(scans[:batch_size], positions[:batch_size])  # 预热
+        for r in range(repeat):
+            for lo in range(0, len(scans), batch_size):
+                t = time.perf_counter()
+                out = model(scans[lo:lo + batch_size], positions[lo:lo + batch_size])
+                latencies.append(time.perf_counter() - t)
+                if r == 0:
+                    predictions[lo:lo + batch_size] = out.numpy()
+    return predictions, np.asarray(latencies)
+
+
+def report(name, predictions, latencies, targets, batch_size, reference=None):
+    threads = torch.get_num_threads()
+    result = {
+        "model": name,
+        "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "p99_ms": float(np.percentile(latencies, 99) * 1e3),
+        "samples_per_s_per_thread": float(batch_size / latencies.mean() / threads),
+        "mse_target": float(np.mean((predictions - targets) ** 2)),
+    }
+    if reference is not None:
+        result["max_abs_diff_fp32"] = float(np.abs(predictions - reference).max())
+        result["mse_fp32"] = float(np.mean((predictions - reference) ** 2))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare fp32 and dynamic int8 CPU inference of the path model")
+    parser.add_argument("checkpoint", help="LidarPathTransformer state_dict saved with torch.save")
+    parser.add_argument("--trains-path", default="./dataset/trains")
+    parser.add_argument("--held-out", type=float, default=0.2, help="fraction of maps used for evaluation")
+    parser.add_argument("--max-samples", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--interop-threads", type=int, default=1)
+    parser.add_argument("--no-pos", action="store_true", help="model was trained without current_pos")
+    parser.add_argument("--parity-atol", type=float, default=1e-4,
+                        help="max abs difference allowed between the lite conversion and the transformers model")
+    args = parser.parse_args()
+
+    configure_threads(args.threads, args.interop_threads)
+    state_dict = torch.load(args.checkpoint, map_location='cpu')
+    # 用不依赖 transformers 的等价模型, 避免导入开销
+    fp32 = LiteLidarPathTransformer.from_bert_state_dict(state_dict, use_pos=not args.no_pos)
+    # 转换前后的输出必须一致, 否则之后的延迟/精度对比没有意义
+    diff = bert_parity(state_dict, fp32, use_pos=not args.no_pos)
+    if diff is None:
+        print("transformers not installed, skipping the lite/BERT parity check")
+    elif diff > args.parity_atol:
+        raise SystemExit(f"lite conversion differs from the transformers model: max abs diff {diff:.3g}")
+    else:
+        print(f"lite/BERT parity: max abs diff {diff:.3g}")
+    scans, positions, targets = held_out_samples(args.trains_path, args.held_out, args.max_samples)
+    print(f"{len(scans)} held-out samples, batch size {args.batch_size}, {torch.get_num_threads()} thread(s)")
+
+    rss = rss_bytes()
+    reference, latencies = benchmark(fp32, scans, positions, args.batch_size)
+    results = [report("fp32", reference, latencies, targets, args.batch_size)]
+    int8 = quantize(fp32)
+    predictions, latencies = benchmark(int8, scans, positions, args.batch_size)
+    results.append(report("int8", predictions, latencies, targets, args.batch_size, reference))
+
+    results[0]["model_bytes"] = model_bytes(fp32)
+    results[1]["model_bytes"] = model_bytes(int8)
+    for result in results:
+        print(", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+    if rss is not None:
+        print(f"rss: {rss / 2**20:.1f} MiB before benchmark, {rss_bytes() / 2**20:.1f} MiB after")
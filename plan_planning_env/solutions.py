@@ -1,83 +1,274 @@
+import itertools
+import time
 import numpy as np
-from shapely.geometry import Point, LineString
-from scipy.spatial import cKDTree
 import heapq
 
+from . import instrument
+from .geometry import rasterize_polygons
+from .grid import DIRECTIONS, FlatGrid
+from .spatial import IncrementalKDTree
+
 class RRT:
-    def __init__(self, Map, step_size=0.5, max_iter=1000):
+    def __init__(self, Map, step_size=0.5, max_iter=1000, batch_size=1):
+        """ Args:
+                batch_size (int): 每次迭代采样的候选点个数, 候选边一次批量做碰撞检测.
+        """
         self.map = Map
         self.start = np.array(self.map.start)
         self.end = np.array(self.map.end)
         self.step_size = step_size
         self.max_iter = max_iter
-        self.tree = [self.start]
-        self.parent = {0: None}
-        self.kdtree = cKDTree([self.start])  # 新增
+        self.batch_size = int(batch_size)
+        # 节点保存在预分配数组中(起点 + max_iter 个新节点 + 终点), parent 为 -1 表示根节点
+        self.kdtree = IncrementalKDTree(capacity=(1024 if max_iter is None else max_iter) + 2)
+        self.tree = self.kdtree.data
+        self.parent = np.full(len(self.tree), -1, dtype=np.int64)
+        self.add_node(self.start, -1)
 
     def sample(self):
         x = np.random.uniform(self.map.size[0][0], self.map.size[1][0])
         y = np.random.uniform(self.map.size[0][1], self.map.size[1][1])
         return np.array([x, y])
 
+    @property
+    def num_nodes(self):
+        return len(self.kdtree)
+
+    def add_node(self, point, parent):
+        # 增量插入KD-Tree, 无需重建
+        idx = self.kdtree.insert(point)
+        instrument.count("rrt.nodes")
+        self.tree = self.kdtree.data
+        if idx >= len(self.parent):
+            self.parent = np.concatenate([self.parent, np.full(len(self.tree) - len(self.parent), -1, dtype=np.int64)])
+        self.parent[idx] = parent
+        return idx
+
     def nearest(self, point):
         # 使用KD-Tree查找最近点
-        dist, idx = self.kdtree.query(point)
+        with instrument.phase("rrt.nearest"):
+            dist, idx = self.kdtree.query(point)
         return idx, self.tree[idx]
 
+    def steer(self, node_near, point):
+        # 从最近节点朝采样点前进一个步长
+        direction = point - node_near
+        direction = direction / np.linalg.norm(direction)
+        return node_near + self.step_size * direction
+
     def collision(self, p1, p2):
-        line = LineString([p1, p2])
-        for obs in self.map.obstacles:
-            if line.crosses(obs) or line.within(obs):
-                return True
-        return False
+        return bool(self.collision_batch(np.asarray(p1)[None], np.asarray(p2)[None])[0])
+
+    def collision_batch(self, starts, ends):
+        """ 批量检测线段 starts[k] -> ends[k], 与障碍物接触/相交/位于其内部均视为碰撞.
+            Args:
+                starts (ndarray): (M, 2).
+                ends (ndarray): (M, 2).
+            Returns:
+                ndarray: (M,) bool.
+        """
+        with instrument.phase("rrt.collision"):
+            instrument.count("rrt.collision_checks", len(starts))
+            return self.map.segments_collide(np.hstack([np.asarray(starts, dtype=np.float64).reshape(-1, 2),
+                                                        np.asarray(ends, dtype=np.float64).reshape(-1, 2)]))
 
     def plan(self):
         for i in range(self.max_iter):
+            # 采样 batch_size 个候选点, 各自朝最近节点扩展, 所有候选边一次检测
+            samples = [self.sample() for _ in range(self.batch_size)]
+            nearest = [self.nearest(rnd) for rnd in samples]
+            near_idx = [idx for idx, _ in nearest]
+            near_nodes = np.array([node for _, node in nearest])
+            new_nodes = np.array([self.steer(node, rnd) for node, rnd in zip(near_nodes, samples)])
+            free = ~self.collision_batch(near_nodes, new_nodes)
+
+            for idx_near, new_node in zip(np.asarray(near_idx)[free], new_nodes[free]):
+                idx_new = self.add_node(new_node, idx_near)
+
+                if np.linalg.norm(new_node - self.end) < 2 * self.step_size:
+                    if not self.collision(new_node, self.end):
+                        self.add_node(self.end, idx_new)
+                        return self.extract_path()
+        return None
+
+    def shortcut(self, path):
+        """
+        贪心捷径: 从当前点一次批量检测到后续所有路径点的连线, 直接跳到最远的无碰撞点.
+        适用于任意规划器得到的路径, 返回新的路径点列表.
+        """
+        path = np.asarray(path, dtype=np.float64)
+        if len(path) < 3:
+            return [p.copy() for p in path]
+        result = [path[0].copy()]
+        i = 0
+        while i < len(path) - 1:
+            targets = path[i + 1:]
+            free = np.flatnonzero(~self.collision_batch(np.broadcast_to(path[i], targets.shape), targets))
+            # 没有无碰撞的连线时(原路径贴着障碍物), 保留下一个点
+            i = i + 1 + (int(free[-1]) if len(free) else 0)
+            result.append(path[i].copy())
+        return result
+
+    def extract_path(self, idx=None):
+        path = []
+        if idx is None:
+            idx = self.num_nodes - 1
+        while idx != -1:
+            path.append(self.tree[idx].copy())
+            idx = self.parent[idx]
+        path.reverse()
+        return path
+
+class RRTStar(RRT):
+    """
+    RRT*: 新节点在半径邻域内选择代价最小的父节点, 并重连邻域内的节点;
+    找到可行解后在以起终点为焦点的椭圆内采样 (Informed RRT*).
+    找到第一条路径后不会停止, 直到 max_iter 或 time_budget 用尽, 返回目前最优的路径.
+    """
+    def __init__(self, Map, step_size=0.5, max_iter=1000, informed=True, time_budget=None, max_radius=None):
+        """ Args:
+                informed (bool): 找到解后是否使用椭圆采样.
+                time_budget (float): 规划时间预算(s), None 表示只受 max_iter 限制;
+                    max_iter 为 None 时只受 time_budget 限制 (anytime 模式).
+                max_radius (float): 重连半径上限(m), 默认 3 * step_size.
+        """
+        if max_iter is None and time_budget is None:
+            raise ValueError("max_iter and time_budget cannot both be None")
+        self.cost = np.zeros(0)
+        self.children = []
+        super().__init__(Map, step_size, max_iter)
+        self.informed = informed
+        self.time_budget = time_budget
+        self.max_radius = 3 * step_size if max_radius is None else max_radius
+        # gamma > 2 * (1 + 1/d)^(1/d) * (面积 / 单位圆面积)^(1/d), d = 2
+        (min_x, min_y), (max_x, max_y) = self.map.size
+        self.gamma = 2 * np.sqrt(1.5) * np.sqrt((max_x - min_x) * (max_y - min_y) / np.pi)
+        # 能直接连到终点的节点, 以及当前最优解
+        self.goal_nodes = []
+        self.best_cost = np.inf
+        self.best_idx = -1
+
+    def add_node(self, point, parent):
+        idx = super().add_node(point, parent)
+        if idx >= len(self.cost):
+            self.cost = np.concatenate([self.cost, np.zeros(len(self.tree) - len(self.cost))])
+        while len(self.children) <= idx:
+            self.children.append([])
+        self.children[idx] = []
+        if parent != -1:
+            self.children[parent].append(idx)
+            self.cost[idx] = self.cost[parent] + np.linalg.norm(point - self.tree[parent])
+        return idx
+
+    def radius(self):
+        n = self.num_nodes + 1
+        return min(self.gamma * np.sqrt(np.log(n) / n), self.max_radius)
+
+    def sample(self):
+        if not (self.informed and np.isfinite(self.best_cost)):
+            return super().sample()
+        # 椭圆: 焦点为起终点, 长轴为当前最优代价
+        c_min = np.linalg.norm(self.end - self.start)
+        center = (self.start + self.end) / 2
+        a = self.best_cost / 2
+        b = np.sqrt(max(self.best_cost ** 2 - c_min ** 2, 0.0)) / 2
+        theta = np.arctan2(self.end[1] - self.start[1], self.end[0] - self.start[0])
+        rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+        (min_x, min_y), (max_x, max_y) = self.map.size
+        while True:
+            r, phi = np.sqrt(np.random.uniform()), np.random.uniform(0, 2 * np.pi)
+            point = center + rotation @ np.array([a * r * np.cos(phi), b * r * np.sin(phi)])
+            if min_x <= point[0] <= max_x and min_y <= point[1] <= max_y:
+                return point
+
+    def rewire(self, idx, parent, cost):
+        # 更换父节点, 并把代价变化传播到整棵子树
+        instrument.count("rrt.rewires")
+        self.children[self.parent[idx]].remove(idx)
+        self.children[parent].append(idx)
+        self.parent[idx] = parent
+        delta = cost - self.cost[idx]
+        stack = [idx]
+        while stack:
+            node = stack.pop()
+            self.cost[node] += delta
+            stack.extend(self.children[node])
+
+    def plan(self):
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        for i in itertools.count() if self.max_iter is None else range(self.max_iter):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
             rnd = self.sample()
             idx_near, node_near = self.nearest(rnd)
-            direction = rnd - node_near
-            direction = direction / np.linalg.norm(direction)
-            new_node = node_near + self.step_size * direction
+            new_node = self.steer(node_near, rnd)
 
             if self.collision(node_near, new_node):
                 continue
 
-            self.tree.append(new_node)
-            self.parent[len(self.tree) - 1] = idx_near
-            # 每次添加新节点后重建KD-Tree
-            self.kdtree = cKDTree(self.tree)
+            # 在邻域内选择代价最小且无碰撞的父节点, 邻居与新节点的连线一次批量检测, 重连时复用
+            neighbours = self.kdtree.query_radius(new_node, self.radius())
+            dists = np.linalg.norm(self.tree[neighbours] - new_node, axis=1)
+            costs = self.cost[neighbours] + dists
+            blocked = self.collision_batch(self.tree[neighbours], np.broadcast_to(new_node, (len(neighbours), 2)))
+            parent = idx_near
+            for k in np.argsort(costs):
+                j = neighbours[k]
+                if j == idx_near or not blocked[k]:
+                    parent = j
+                    break
+            idx_new = self.add_node(new_node, parent)
+
+            # 重连: 经由新节点更近的邻居改挂到新节点下
+            for j, d, b in zip(neighbours, dists, blocked):
+                if j == parent:
+                    continue
+                cost = self.cost[idx_new] + d
+                if cost < self.cost[j] and not b:
+                    self.rewire(j, idx_new, cost)
 
             if np.linalg.norm(new_node - self.end) < 2 * self.step_size:
                 if not self.collision(new_node, self.end):
-                    self.tree.append(self.end)
-                    self.parent[len(self.tree) - 1] = len(self.tree) - 2
-                    self.kdtree = cKDTree(self.tree)
-                    return self.extract_path()
-        return None
+                    self.goal_nodes.append(idx_new)
+            if self.goal_nodes:
+                goal_nodes = np.array(self.goal_nodes)
+                goal_costs = self.cost[goal_nodes] + np.linalg.norm(self.tree[goal_nodes] - self.end, axis=1)
+                k = int(np.argmin(goal_costs))
+                self.best_idx, self.best_cost = int(goal_nodes[k]), float(goal_costs[k])
 
-    def extract_path(self):
-        path = []
-        idx = len(self.tree) - 1
-        while idx is not None:
-            path.append(self.tree[idx])
-            idx = self.parent[idx]
-        path.reverse()
+        if self.best_idx == -1:
+            return None
+        path = self.extract_path(self.best_idx)
+        path.append(self.end.copy())
         return path
 
-class WaveFront:
+class GridPlanner:
     """
-    基于栅格的涟漪（Wavefront）路径规划算法
+    栅格规划算法的基类: 膨胀障碍物后的占据栅格及坐标转换
     """
-    def __init__(self, Map, grid_resolution=0.1, safe_margin=0.2):
+    def __init__(self, Map, grid_resolution=0.1, safe_margin=0.2, cache=None, grid=None):
+        """ Args:
+                cache (OccupancyGridCache): 栅格缓存, 同一地图的多个实例共享栅格, None 表示不缓存.
+                grid (ndarray): 已生成的占据栅格(例如共享内存中的), 给定时跳过栅格化.
+        """
         self.map = Map
         self.grid_resolution = grid_resolution
         self.safe_margin = safe_margin  # 新增：安全距离
+        self.cache = cache
         self.start = np.array(self.map.start)
         self.end = np.array(self.map.end)
-        self.grid, self.ox, self.oy = self.create_occupancy_grid()
+        self.grid, self.ox, self.oy = self.create_occupancy_grid(grid)
         self.rows, self.cols = self.grid.shape
+        self._flat_grid = None
 
-    def create_occupancy_grid(self):
+    @property
+    def flat_grid(self):
+        # 只用栅格本身(例如 Lidar 的 'grid' 后端)时不需要补边展平的副本
+        if self._flat_grid is None:
+            self._flat_grid = FlatGrid(self.grid)
+        return self._flat_grid
+
+    def create_occupancy_grid(self, grid=None):
         """
         将地图障碍物转为栅格地图，并考虑安全距离
         """
@@ -85,18 +276,23 @@ class WaveFront:
         max_x, max_y = self.map.size[1]
         ox = np.arange(min_x, max_x + self.grid_resolution, self.grid_resolution)
         oy = np.arange(min_y, max_y + self.grid_resolution, self.grid_resolution)
-        grid = np.zeros((len(ox), len(oy)), dtype=np.int8)
-        # 对障碍物进行膨胀
-        buffered_obs = [obs.buffer(self.safe_margin) for obs in self.map.obstacles]
-        for i, x in enumerate(ox):
-            for j, y in enumerate(oy):
-                p = Point(x, y)
-                for obs in buffered_obs:
-                    if obs.contains(p):
-                        grid[i, j] = 1  # 障碍物
-                        break
+        if grid is not None:
+            if grid.shape != (len(ox), len(oy)):
+                raise ValueError(f"grid shape {grid.shape} does not match map size, expected {(len(ox), len(oy))}")
+        elif self.cache is None:
+            grid = self.rasterize(ox, oy)
+        else:
+            key = self.cache.key(self.map, self.grid_resolution, self.safe_margin)
+            grid = self.cache.get(key, lambda: self.rasterize(ox, oy))
         return grid, ox, oy
 
+    def rasterize(self, ox, oy):
+        # 对障碍物进行膨胀, 再对每个膨胀后的障碍物批量判断包围盒内的栅格点
+        with instrument.phase("grid.rasterize"):
+            # safe_margin 为 0 时也要 buffer, buffer(0) 会修复自相交的多边形, 栅格与原来一致
+            buffered_obs = [obs.buffer(self.safe_margin) for obs in self.map.obstacles]
+            return rasterize_polygons(buffered_obs, ox, oy)
+
     def pos_to_idx(self, pos):
         ix = int(round((pos[0] - self.ox[0]) / self.grid_resolution))
         iy = int(round((pos[1] - self.oy[0]) / self.grid_resolution))
@@ -107,6 +303,18 @@ class WaveFront:
         y = self.oy[idx[1]]
         return np.array([x, y])
 
+    def plan(self):
+        raise NotImplementedError
+
+class WaveFront(GridPlanner):
+    """
+    基于栅格的涟漪（Wavefront）路径规划算法
+    """
+    def __init__(self, Map, grid_resolution=0.1, safe_margin=0.2, cache=None, grid=None):
+        super().__init__(Map, grid_resolution, safe_margin, cache, grid)
+        # 最近一次完整扩散的 (终点栅格下标, 展平步数场)
+        self._field = None
+
     def plan(self):
         """
         执行涟漪算法，返回路径（若找到）
@@ -116,43 +324,280 @@ class WaveFront:
         if self.grid[start_idx] == 1 or self.grid[end_idx] == 1:
             return None  # 起点或终点在障碍物内
 
-        wave = np.full_like(self.grid, -1, dtype=np.int32)
-        wave[end_idx] = 0
-        queue = [end_idx]
-        dirs = [(-1,0),(1,0),(0,-1),(0,1),(-1,-1),(-1,1),(1,-1),(1,1)]
-
-        # 涟漪扩散
-        while queue:
-            curr = queue.pop(0)
-            for d in dirs:
-                ni, nj = curr[0] + d[0], curr[1] + d[1]
-                if 0 <= ni < self.rows and 0 <= nj < self.cols:
-                    if self.grid[ni, nj] == 0 and wave[ni, nj] == -1:
-                        wave[ni, nj] = wave[curr] + 1
-                        queue.append((ni, nj))
-                        if (ni, nj) == start_idx:
-                            queue = []
-                            break
+        flat = self.flat_grid
+        start_flat = flat.to_flat(start_idx)
+        if self._field is not None and self._field[0] == end_idx:
+            # 已有该终点的完整步数场, 直接回溯
+            wave = self._field[1]
+        else:
+            # 从终点开始涟漪扩散, 到达起点所在的层后停止
+            wave = self.flood(flat.to_flat(end_idx), stop=start_flat)
+        return self.extract_path(wave, start_idx)
 
+    def extract_path(self, wave, start_idx):
+        """ 沿展平的步数场从起点回溯到终点, 返回的路径从终点开始. """
+        flat = self.flat_grid
+        start_flat = flat.to_flat(start_idx)
         # 回溯路径
-        if wave[start_idx] == -1:
+        if wave[start_flat] == -1:
             return None  # 无法到达
 
+        with instrument.phase("wavefront.backtrack"):
+            path = [self.idx_to_pos(flat.to_idx(f)) for f in flat.descend(wave, start_flat)]
+            path.reverse()
+        return path
+
+    def flood(self, source, stop=None):
+        with instrument.phase("wavefront.flood"):
+            wave = self.flat_grid.flood(source, stop)
+        if instrument.enabled():
+            instrument.count("wavefront.floods")
+            instrument.count("wavefront.cells_reached", int(np.count_nonzero(wave >= 0)))
+        return wave
+
+    def distance_field(self, end=None):
+        """
+        从终点扩散到所有可达栅格的步数场(8 邻域, 每步代价为 1), 不可达为 -1.
+        结果按终点缓存, 可乘以 grid_resolution 作为近似的 cost-to-go 特征.
+            Args:
+                end (array): 终点坐标, 默认 self.end.
+            Returns:
+                ndarray: (rows, cols) int32, 只读.
+        """
+        end_idx = self.pos_to_idx(self.end if end is None else end)
+        flat = self.flat_grid
+        if self._field is None or self._field[0] != end_idx:
+            if self.grid[end_idx] == 1:
+                wave = np.full(flat.free.size, -1, dtype=np.int32)
+            else:
+                wave = self.flood(flat.to_flat(end_idx))
+            wave.flags.writeable = False
+            self._field = (end_idx, wave)
+        return flat.unpad(self._field[1])
+
+    def plan_many(self, starts, end=None):
+        """
+        终点相同的一批起点只扩散一次, 再分别回溯.
+        每条路径与对应起点单独调用 plan() 的结果相同.
+            Args:
+                starts (array): (N, 2) 起点坐标.
+                end (array): 终点坐标, 默认 self.end.
+            Returns:
+                list: 每个起点的路径, 起点在障碍物内或无法到达时为 None.
+        """
+        self.distance_field(end)
+        end_idx, wave = self._field
+        paths = []
+        for start in starts:
+            start_idx = self.pos_to_idx(start)
+            if self.grid[start_idx] == 1 or self.grid[end_idx] == 1:
+                paths.append(None)
+            else:
+                paths.append(self.extract_path(wave, start_idx))
+        return paths
+
+class AStar(GridPlanner):
+    """
+    基于栅格的 A* 路径规划算法, 与 WaveFront 使用同一占据栅格.
+    8 邻域, 直行代价 1, 斜行代价 sqrt(2), 斜行时两侧的直行邻居都必须可通行(不切角);
+    启发函数为 octile 距离, 可采纳且一致. 返回的路径格式与 WaveFront.plan() 相同(从终点开始).
+    """
+    SQRT2 = np.sqrt(2.0)
+
+    def __init__(self, Map, grid_resolution=0.1, safe_margin=0.2, cache=None, grid=None):
+        super().__init__(Map, grid_resolution, safe_margin, cache, grid)
+        self.expanded = 0  # 最近一次规划展开的节点数
+        # (偏移, 代价, 两侧直行邻居的偏移), 直行时两侧偏移为 0 即自身
+        self._moves = [(self.offset(di, dj), self.SQRT2 if di and dj else 1.0,
+                        self.offset(di, 0), self.offset(0, dj)) for di, dj in DIRECTIONS.tolist()]
+
+    def offset(self, di, dj):
+        return int(di) * self.flat_grid.stride + int(dj)
+
+    def heuristic(self, node, goal):
+        stride = self.flat_grid.stride
+        dx = abs(node // stride - goal // stride)
+        dy = abs(node % stride - goal % stride)
+        return max(dx, dy) + (self.SQRT2 - 1) * min(dx, dy)
+
+    def successors(self, node, parent, goal):
+        """ 返回 [(后继节点, 代价)]. """
+        free = self.flat_grid.free
+        return [(node + off, cost) for off, cost, side_i, side_j in self._moves
+                if free[node + off] and free[node + side_i] and free[node + side_j]]
+
+    def plan(self):
+        """
+        执行 A* 搜索，返回路径（若找到）
+        """
+        start_idx = self.pos_to_idx(self.start)
+        end_idx = self.pos_to_idx(self.end)
+        if self.grid[start_idx] == 1 or self.grid[end_idx] == 1:
+            return None  # 起点或终点在障碍物内
+
+        flat = self.flat_grid
+        start, goal = int(flat.to_flat(start_idx)), int(flat.to_flat(end_idx))
+        g = np.full(flat.free.size, np.inf)
+        parent = np.full(flat.free.size, -1, dtype=np.int64)
+        closed = np.zeros(flat.free.size, dtype=bool)
+        g[start] = 0.0
+        heap = [(self.heuristic(start, goal), 0.0, start)]
+        self.expanded = 0
+
+        name = type(self).__name__.lower()
+        found = False
+        with instrument.phase(name + ".search"):
+            while heap:
+                _, cost, node = heapq.heappop(heap)
+                node = int(node)
+                if closed[node]:
+                    continue
+                closed[node] = True
+                self.expanded += 1
+                if node == goal:
+                    found = True
+                    break
+                for nxt, step in self.successors(node, parent[node], goal):
+                    new_cost = cost + step
+                    if not closed[nxt] and new_cost < g[nxt]:
+                        g[nxt] = new_cost
+                        parent[nxt] = node
+                        heapq.heappush(heap, (new_cost + self.heuristic(nxt, goal), new_cost, nxt))
+        instrument.count(name + ".nodes_expanded", self.expanded)
+        if not found:
+            return None  # 无法到达
+        with instrument.phase(name + ".backtrack"):
+            return self.extract_path(parent, goal)
+
+    def extract_path(self, parent, goal):
+        # 从终点沿 parent 回溯, 相邻节点之间补齐中间栅格 (JPS 的跳点之间是直线或 45 度斜线)
+        flat = self.flat_grid
         path = []
-        curr = start_idx
-        while curr != end_idx:
-            path.append(self.idx_to_pos(curr))
-            min_wave = wave[curr]
-            next_idx = curr
-            for d in dirs:
-                ni, nj = curr[0] + d[0], curr[1] + d[1]
-                if 0 <= ni < self.rows and 0 <= nj < self.cols:
-                    if wave[ni, nj] >= 0 and wave[ni, nj] < min_wave:
-                        min_wave = wave[ni, nj]
-                        next_idx = (ni, nj)
-            if next_idx == curr:
-                break  # 死循环保护
-            curr = next_idx
-        path.append(self.idx_to_pos(end_idx))
-        path.reverse()
-        return path
\ No newline at end of file
+        node = goal
+        while node != -1:
+            prev = parent[node]
+            i, j = flat.to_idx(node)
+            if prev == -1:
+                path.append(self.idx_to_pos((i, j)))
+                break
+            pi, pj = flat.to_idx(prev)
+            steps = max(abs(pi - i), abs(pj - j))
+            di, dj = np.sign(pi - i), np.sign(pj - j)
+            for k in range(steps):
+                path.append(self.idx_to_pos((i + k * di, j + k * dj)))
+            node = prev
+        return path
+
+class JPS(AStar):
+    """
+    跳点搜索 (Jump Point Search), 与 AStar 使用相同的移动规则, 路径代价相同,
+    但只把跳点放入开放列表, 在空旷地图上展开的节点数少几个数量级.
+    直行跳跃查预先计算的停止点距离表 (类似 JPS+), 斜行跳跃逐格前进.
+    """
+    def __init__(self, Map, grid_resolution=0.1, safe_margin=0.2, cache=None, grid=None):
+        super().__init__(Map, grid_resolution, safe_margin, cache, grid)
+        self._tables = None  # 四个直行方向的停止点距离表, 首次规划时计算
+
+    def successors(self, node, parent, goal):
+        free = self.flat_grid.free
+        stride = self.flat_grid.stride
+        if parent == -1:
+            directions = DIRECTIONS.tolist()
+        else:
+            # 根据来向剪枝
+            di = int(np.sign(node // stride - parent // stride))
+            dj = int(np.sign(node % stride - parent % stride))
+            directions = []
+            if di and dj:
+                directions += [(0, dj), (di, 0), (di, dj)]
+            elif di:
+                directions += [(di, 0), (di, 1), (di, -1), (0, 1), (0, -1)]
+            else:
+                directions += [(0, dj), (1, dj), (-1, dj), (1, 0), (-1, 0)]
+
+        result = []
+        for di, dj in directions:
+            nxt = node + self.offset(di, dj)
+            if not free[nxt]:
+                continue
+            if di and dj and not (free[node + self.offset(di, 0)] and free[node + self.offset(0, dj)]):
+                continue
+            jump_point = self.jump(nxt, di, dj, goal)
+            if jump_point != -1:
+                stride_di = abs(jump_point // stride - node // stride)
+                stride_dj = abs(jump_point % stride - node % stride)
+                steps = max(stride_di, stride_dj)
+                result.append((jump_point, steps * (self.SQRT2 if di and dj else 1.0)))
+        return result
+
+    def _straight_table(self, di, dj):
+        """ 沿直行方向 (di, dj) 到下一个停止点(障碍物或有强迫邻居的栅格)的步数, 展平. """
+        flat = self.flat_grid
+        free = flat.free.reshape(flat.rows + 2, flat.cols + 2)
+
+        def shifted(a, si, sj):
+            # shifted(a)[i, j] = a[i + si, j + sj], 越界为 False
+            out = np.zeros_like(a)
+            rows, cols = a.shape
+            out[max(-si, 0):rows - max(si, 0), max(-sj, 0):cols - max(sj, 0)] = \
+                a[max(si, 0):rows + min(si, 0), max(sj, 0):cols + min(sj, 0)]
+            return out
+
+        if di:
+            forced = (shifted(free, 0, 1) & ~shifted(free, -di, 1)) | (shifted(free, 0, -1) & ~shifted(free, -di, -1))
+        else:
+            forced = (shifted(free, 1, 0) & ~shifted(free, 1, -dj)) | (shifted(free, -1, 0) & ~shifted(free, -1, -dj))
+        stop = ~free | forced
+
+        axis, step = (0, di) if di else (1, dj)
+        n = stop.shape[axis]
+        coord = np.arange(n).reshape((-1, 1) if axis == 0 else (1, -1))
+        coord = np.broadcast_to(coord, stop.shape)
+        if step > 0:
+            # 每个栅格之后(含自身)第一个停止点的坐标: 反向累计最小值
+            nearest = np.where(stop, coord, n)
+            nearest = np.flip(np.minimum.accumulate(np.flip(nearest, axis), axis=axis), axis)
+            dist = nearest - coord
+        else:
+            nearest = np.where(stop, coord, -1)
+            nearest = np.maximum.accumulate(nearest, axis=axis)
+            dist = coord - nearest
+        return dist.astype(np.int64).ravel()
+
+    def jump_straight(self, node, di, dj, goal):
+        """ 直行跳跃: 查表得到停止点, O(1). """
+        if self._tables is None:
+            with instrument.phase("jps.tables"):
+                self._tables = {d: self._straight_table(*d) for d in [(1, 0), (-1, 0), (0, 1), (0, -1)]}
+        stride = self.flat_grid.stride
+        k = int(self._tables[(di, dj)][node])
+        # 终点在射线上且不晚于停止点
+        node_i, node_j = divmod(node, stride)
+        goal_i, goal_j = divmod(goal, stride)
+        if di and goal_j == node_j and 0 <= (goal_i - node_i) * di <= k:
+            return goal
+        if dj and goal_i == node_i and 0 <= (goal_j - node_j) * dj <= k:
+            return goal
+        stop = node + k * self.offset(di, dj)
+        return stop if self.flat_grid.free[stop] else -1
+
+    def jump(self, node, di, dj, goal):
+        """ 从 node 沿 (di, dj) 前进直到找到跳点, 没有跳点返回 -1. """
+        if not (di and dj):
+            return self.jump_straight(node, di, dj, goal)
+        free = self.flat_grid.free
+        offset = self.offset
+        step = offset(di, dj)
+        while True:
+            if not free[node]:
+                return -1
+            if node == goal:
+                return node
+            # 斜行时, 若沿两个直行分量能找到跳点, 则当前节点是跳点
+            if self.jump_straight(node + offset(di, 0), di, 0, goal) != -1 or \
+               self.jump_straight(node + offset(0, dj), 0, dj, goal) != -1:
+                return node
+            # 不切角: 斜行要求两侧直行邻居可通行
+            if not (free[node + offset(di, 0)] and free[node + offset(0, dj)]):
+                return -1
+            node += step
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-21 09:40:57
+# Description: 支持增量插入的最近邻索引
+import numpy as np
+from scipy.spatial import cKDTree
+
+from . import instrument
+
+
+class IncrementalKDTree:
+    """
+    对数结构的 KD-Tree 森林 (Bentley-Saxe):
+    新点先进入暴力搜索的缓冲区, 缓冲区满后与大小不超过它的树合并重建,
+    森林中最多 O(log n) 棵树, 插入均摊 O(log^2 n), 查询 O(log^2 n + buffer_size).
+    所有点按插入顺序保存在预分配的 self.data 中, 下标即插入序号.
+    """
+    def __init__(self, capacity=1024, dim=2, buffer_size=64):
+        """ Args:
+                capacity (int): 预分配的点数, 不足时自动翻倍.
+                dim (int): 点的维度.
+                buffer_size (int): 暴力搜索缓冲区大小.
+        """
+        self.data = np.empty((max(int(capacity), 1), dim), dtype=np.float64)
+        self.size = 0
+        self.buffer_size = int(buffer_size)
+        # (lo, hi, cKDTree), 覆盖 data[lo:hi], 按 lo 升序(规模递减)
+        self._forest = []
+        self._indexed = 0
+        self.rebuilds = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, point):
+        """ 插入一个点, 返回其下标. """
+        if self.size == len(self.data):
+            grown = np.empty((2 * len(self.data), self.data.shape[1]), dtype=np.float64)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        idx = self.size
+        self.data[idx] = point
+        self.size += 1
+        if self.size - self._indexed >= self.buffer_size:
+            self._merge()
+        return idx
+
+    def _merge(self):
+        # 类似二进制进位: 吞并所有不大于新块的树
+        lo = self._indexed
+        while self._forest and self._forest[-1][1] - self._forest[-1][0] <= self.size - lo:
+            lo = self._forest.pop()[0]
+        self._forest.append((lo, self.size, cKDTree(self.data[lo:self.size])))
+        self._indexed = self.size
+        self.rebuilds += 1
+        instrument.count("kdtree.rebuilds")
+        instrument.count("kdtree.points_rebuilt", self.size - lo)
+
+    def query(self, point):
+        """ 最近邻查询, 返回 (距离, 下标). """
+        point = np.asarray(point, dtype=np.float64)
+        best_dist, best_idx = np.inf, -1
+        # 先查缓冲区, 得到的距离作为各棵树的剪枝上界
+        if self._indexed < self.size:
+            diff = self.data[self._indexed:self.size] - point
+            dists = np.einsum('ij,ij->i', diff, diff)
+            idx = int(np.argmin(dists))
+            best_dist, best_idx = np.sqrt(dists[idx]), self._indexed + idx
+        for lo, _, tree in reversed(self._forest):
+            dist, idx = tree.query(point, distance_upper_bound=best_dist)
+            if dist < best_dist:
+                best_dist, best_idx = dist, lo + idx
+        return float(best_dist), int(best_idx)
+
+    def query_radius(self, point, r):
+        """ 返回与 point 距离不超过 r 的所有点的下标(升序). """
+        point = np.asarray(point, dtype=np.float64)
+        found = [lo + np.asarray(tree.query_ball_point(point, r), dtype=np.int64)
+                 for lo, _, tree in self._forest]
+        if self._indexed < self.size:
+            dists = np.linalg.norm(self.data[self._indexed:self.size] - point, axis=1)
+            found.append(self._indexed + np.flatnonzero(dists <= r))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
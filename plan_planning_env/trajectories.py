@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: butteria
+# Email: butteriaaa@gmail.com
+# Created on: 2025-06-27 11:26:40
+# Description: 把规划好的路径回放为 (lidar_scan, current_pos) -> (dx, dy) 训练样本, 存为内存映射数组
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .dataset import DEFAULT_MAP_SIZE, PathDataset, list_sources, load_maps
+from .env import Map, PathPlanningWithLidar
+
+try:
+    import torch
+    from torch.utils.data import IterableDataset, get_worker_info
+except ImportError:  # torch 只在训练时需要
+    torch = None
+    IterableDataset = object
+
+# 每个分片目录下的数组文件
+ARRAYS = ("scans", "positions", "targets")
+
+
+def iter_shard_maps(sources, shard, num_shards):
+    """ 按顺序遍历所有地图, 第 k 张地图属于第 k % num_shards 个分片.
+        产生 (名称, 障碍物顶点, map_size, paths), paths 为该地图各条路径的 (n, 2) 数组(不含没有路径的 run).
+        .npz 直接切片 path_points/run_path_offsets 列, 不经过逐路径点的旧格式 dict.
+    """
+    k = 0
+    for source in sources:
+        if source.endswith(".npz"):
+            dataset = PathDataset.load(source)
+            for m in range(dataset.num_maps):
+                if k % num_shards == shard:
+                    paths = [dataset.path(r) for r in dataset.runs(m)]
+                    yield (str(dataset.map_names[m]), dataset.obstacles(m), dataset.map_size[m].tolist(),
+                           [path for path in paths if path is not None])
+                k += 1
+            continue
+        # 一个 .pkl 只有一张地图, 不属于该分片时不打开文件
+        if k % num_shards != shard:
+            k += 1
+            continue
+        for name, data in load_maps(source):
+            paths = [np.asarray(run["path"], dtype=np.float64).reshape(-1, 2) for run in data.get("runs", [])
+                     if run.get("path") is not None and len(run["path"]) > 0]
+            yield name, data["obstacles"], data.get("map_size", DEFAULT_MAP_SIZE), paths
+            k += 1
+
+
+def replay(env, path):
+    """ 沿路径回放 env (observation='ranges'), 逐步产生 (scan, pos, target). target 为到下一个路径点的位移.
+        scan 是 lidar 复用的缓冲区, 下一步会被覆盖, 需要保留时由调用方复制.
+    """
+    env.path = path
+    env.reset()
+    # 第一步停留在路径起点(map.start 即 path[0]), 之后每步前进一个路径点
+    _, (x, y, scan, _) = env.step()
+    for k in range(len(path) - 1):
+        yield scan, (x, y), np.asarray(path[k + 1]) - np.asarray(path[k])
+        if k < len(path) - 2:
+            _, (x, y, scan, _) = env.step()
+
+
+def generate_shard(sources, out_dir, shard=0, num_shards=1, lidar_backend='numpy'):
+    """ 生成一个分片, 写入 out_dir/shard-XXXXX/{scans,positions,targets}.npy.
+        不同分片互不依赖, 可以在不同进程或机器上生成.
+        Returns:
+            int: 分片的样本数.
+    """
+    # 分片的地图只读一次, 先统计样本数, 一次性分配磁盘数组
+    maps = list(iter_shard_maps(sources, shard, num_shards))
+    count = sum(len(path) - 1 for _, _, _, paths in maps for path in paths if len(path) > 1)
+
+    shard_dir = os.path.join(out_dir, f"shard-{shard:05d}")
+    os.makedirs(shard_dir, exist_ok=True)
+    num_angle = None
+    arrays = None
+    n = 0
+    for _, obstacles, map_size, paths in maps:
+        # 每张地图只构建一次 Map 和 env, 各路径只更新起终点
+        env = PathPlanningWithLidar(Map(obstacles, map_size=map_size), lidar_backend=lidar_backend,
+                                    observation='ranges')
+        for path in paths:
+            if len(path) < 2:
+                continue
+            path = np.asarray(path, dtype=np.float64)
+            env.map.start, env.map.end = path[0], path[-1]
+            if arrays is None:
+                num_angle = env.lidar.num_angle
+                arrays = {
+                    "scans": np.lib.format.open_memmap(os.path.join(shard_dir, "scans.npy"), mode='w+',
+                                                       dtype=np.float32, shape=(count, num_angle)),
+                    "positions": np.lib.format.open_memmap(os.path.join(shard_dir, "positions.npy"), mode='w+',
+                                                           dtype=np.float32, shape=(count, 2)),
+                    "targets": np.lib.format.open_memmap(os.path.join(shard_dir, "targets.npy"), mode='w+',
+                                                         dtype=np.float32, shape=(count, 2)),
+                }
+            for scan, pos, target in replay(env, path):
+                arrays["scans"][n] = scan
+                arrays["positions"][n] = pos
+                arrays["targets"][n] = target
+                n += 1
+
+    if arrays is None:
+        return 0
+    for array in arrays.values():
+        array.flush()
+    with open(os.path.join(shard_dir, "meta.json"), "w") as f:
+        json.dump({"count": n, "num_angle": num_angle}, f)
+    return n
+
+
+def generate(sources, out_dir, num_shards=1, workers=1, lidar_backend='numpy'):
+    """ 用进程池并行生成所有分片. """
+    os.makedirs(out_dir, exist_ok=True)
+    if workers <= 1:
+        return [generate_shard(sources, out_dir, shard, num_shards, lidar_backend) for shard in range(num_shards)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(generate_shard, sources, out_dir, shard, num_shards, lidar_backend)
+                   for shard in range(num_shards)]
+        return [future.result() for future in futures]
+
+
+class TrajectoryStore:
+    """
+    读取 generate() 写出的分片, 所有数组按需内存映射, 不整体读入内存.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.shards = []
+        for entry in sorted(os.scandir(root), key=lambda e: e.name):
+            meta_path = os.path.join(entry.path, "meta.json")
+            if not entry.is_dir() or not os.path.exists(meta_path):
+                continue  # 未完成的分片没有 meta.json
+            self.shards.append({name: np.load(os.path.join(entry.path, name + ".npy"), mmap_mode='r')
+                                for name in ARRAYS})
+        self.offsets = np.zeros(len(self.shards) + 1, dtype=np.int64)
+        np.cumsum([len(shard["scans"]) for shard in self.shards], out=self.offsets[1:])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, i):
+        s = int(np.searchsorted(self.offsets, i, side='right') - 1)
+        j = i - self.offsets[s]
+        return tuple(np.asarray(self.shards[s][name][j]) for name in ARRAYS)
+
+    def chunks(self, chunk_size):
+        """ 所有 (分片, 起点, 终点) 连续块. """
+        return [(s, lo, min(lo + chunk_size, len(shard["scans"])))
+                for s, shard in enumerate(self.shards)
+                for lo in range(0, len(shard["scans"]), chunk_size)]
+
+    def iter_batches(self, batch_size, shuffle=True, seed=None, chunk_size=4096, buffer_chunks=8,
+                     drop_last=False, chunks=None):
+        """ 流式产生 (scans, positions, targets) mini-batch.
+            打乱时先打乱块的顺序, 每次顺序读入 buffer_chunks 个连续块到内存, 在缓冲区内再打乱,
+            既保持顺序读盘, 内存也只占 buffer_chunks * chunk_size 个样本.
+        """
+        rng = np.random.default_rng(seed)
+        chunks = self.chunks(chunk_size) if chunks is None else chunks
+        if shuffle:
+            chunks = [chunks[k] for k in rng.permutation(len(chunks))]
+        carry = None
+        for lo in range(0, len(chunks), buffer_chunks):
+            buffer = [[np.asarray(self.shards[s][name][a:b]) for s, a, b in chunks[lo:lo + buffer_chunks]]
+                      for name in ARRAYS]
+            buffer = [np.concatenate(parts) for parts in buffer]
+            if carry is not None:
+                buffer = [np.concatenate([c, b]) for c, b in zip(carry, buffer)]
+            if shuffle:
+                order = rng.permutation(len(buffer[0]))
+                buffer = [array[order] for array in buffer]
+            full = len(buffer[0]) // batch_size * batch_size
+            for k in range(0, full, batch_size):
+                yield tuple(array[k:k + batch_size] for array in buffer)
+            carry = [array[full:] for array in buffer]
+        if carry is not None and len(carry[0]) and not drop_last:
+            yield tuple(carry)
+
+
+class TrajectoryIterableDataset(IterableDataset):
+    """
+    torch IterableDataset, 每个元素是一个 batch 的 (lidar_scan, current_pos, target) 张量.
+    DataLoader 多进程时按 worker 切分数据块, 使用时设置 batch_size=None.
+    """
+    def __init__(self, root, batch_size, shuffle=True, seed=0, chunk_size=4096, buffer_chunks=8):
+        if torch is None:
+            raise ImportError("TrajectoryIterableDataset requires torch")
+        self.root = root
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        store = TrajectoryStore(self.root)
+        chunks = store.chunks(self.chunk_size)
+        # 所有 worker 用相同的种子打乱块顺序, 再各取一部分
+        order = np.random.default_rng((self.seed, self.epoch)).permutation(len(chunks)) if self.shuffle \
+            else np.arange(len(chunks))
+        chunks = [chunks[k] for k in order]
+        info = get_worker_info()
+        if info is not None:
+            chunks = chunks[info.id::info.num_workers]
+        worker_seed = (self.seed, self.epoch, 0 if info is None else info.id)
+        for batch in store.iter_batches(self.batch_size, shuffle=self.shuffle, seed=worker_seed,
+                                        buffer_chunks=self.buffer_chunks, chunks=chunks):
+            yield tuple(torch.from_numpy(array) for array in batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="replay planned paths into a memory-mapped lidar sample store")
+    parser.add_argument("sources", nargs="+", help=".pkl/.npz files or directories containing them")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("--num-shards", type=int, default=1)
+    parser.add_argument("--shard", type=int, default=None, help="only generate this shard (for multi-machine runs)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--lidar-backend", default="numpy")
+    args = parser.parse_args()
+
+    sources = list_sources(args.sources)
+    if args.shard is not None:
+        os.makedirs(args.output, exist_ok=True)
+        counts = [generate_shard(sources, args.output, args.shard, args.num_shards, args.lidar_backend)]
+    else:
+        counts = generate(sources, args.output, args.num_shards, args.workers, args.lidar_backend)
+    print(f"{args.output}: {sum(counts)} samples in {len(counts)} shard(s)")
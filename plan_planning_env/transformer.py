@@ -3,6 +3,8 @@ import torch
 from torch import nn
 from transformers import BertModel, BertConfig
 
+from .lite import LiteLidarPathTransformer
+
 class LidarPathTransformer(nn.Module):
     """
     使用 Hugging Face 的 BertModel 作为自注意力编码器
@@ -46,6 +48,11 @@ class LidarPathTransformer(nn.Module):
         out = self.output_fc(pooled)
         return out
 
+    def to_lite(self):
+        """ 转换为不依赖 transformers 的 LiteLidarPathTransformer, 输出与本模型一致. """
+        return LiteLidarPathTransformer.from_bert_state_dict(self.state_dict(), use_pos=self.use_pos,
+                                                             num_heads=self.bert.config.num_attention_heads)
+
 class PathPredictor:
     """
     推理循环：输入雷达，预测下一个点，直到终点
@@ -53,23 +60,80 @@ class PathPredictor:
     def __init__(self, model, device='cpu'):
         self.model = model.to(device)
         self.device = device
+        # 批量推理复用的输入张量, 按需扩容
+        self.__scan_buffer = None
+        self.__pos_buffer = None
+
+    def __buffers(self, batch_size, lidar_dim):
+        if self.__scan_buffer is None or self.__scan_buffer.shape[0] < batch_size \
+                or self.__scan_buffer.shape[1] != lidar_dim:
+            self.__scan_buffer = torch.empty((batch_size, lidar_dim), dtype=torch.float32, device=self.device)
+            self.__pos_buffer = torch.empty((batch_size, 2), dtype=torch.float32, device=self.device)
+        return self.__scan_buffer[:batch_size], self.__pos_buffer[:batch_size]
+
+    def predict_batch(self, lidar_scans, current_pos):
+        """ 一次前向计算一批样本.
+            Args:
+                lidar_scans (ndarray): (B, lidar_dim).
+                current_pos (ndarray): (B, 2).
+            Returns:
+                ndarray: (B, 2) dx, dy.
+        """
+        lidar_scans = np.asarray(lidar_scans, dtype=np.float32)
+        current_pos = np.asarray(current_pos, dtype=np.float32)
+        scan_tensor, pos_tensor = self.__buffers(len(lidar_scans), lidar_scans.shape[1])
+        with torch.inference_mode():
+            scan_tensor.copy_(torch.from_numpy(lidar_scans))
+            pos_tensor.copy_(torch.from_numpy(current_pos))
+            return self.model(scan_tensor, pos_tensor).cpu().numpy()
 
     def predict_next(self, lidar_scan, current_pos):
         self.model.eval()
-        lidar_tensor = torch.tensor(lidar_scan, dtype=torch.float32, device=self.device).unsqueeze(0)
-        pos_tensor = torch.tensor(current_pos, dtype=torch.float32, device=self.device).unsqueeze(0)
-        with torch.no_grad():
-            delta = self.model(lidar_tensor, pos_tensor).cpu().numpy()[0]
+        delta = self.predict_batch(np.asarray(lidar_scan)[None], np.asarray(current_pos)[None])[0]
         return delta  # dx, dy
 
     def plan_path(self, lidar_scan_func, start_pos, end_pos, max_steps=100, threshold=0.2):
         path = [np.array(start_pos)]
         current_pos = np.array(start_pos)
+        self.model.eval()
         for _ in range(max_steps):
             lidar_scan = lidar_scan_func(current_pos)
-            delta = self.predict_next(lidar_scan, current_pos)
+            delta = self.predict_batch(np.asarray(lidar_scan)[None], current_pos[None])[0]
             current_pos = current_pos + delta
             path.append(current_pos.copy())
             if np.linalg.norm(current_pos - end_pos) < threshold:
                 break
-        return np.array(path)
\ No newline at end of file
+        return np.array(path)
+
+    def plan_paths(self, lidar_scan_func, start_pos, end_pos, max_steps=100, threshold=0.2):
+        """ 多组起终点同步推进, 每步所有未结束的轨迹只做一次前向, 到达终点的轨迹移出批次.
+            Args:
+                lidar_scan_func: f(positions (B, 2), episodes (B,)) -> (B, lidar_dim) 雷达测距,
+                                 episodes 为当前仍在批次中的轨迹编号, 可用于区分各自的地图,
+                                 例如 VectorPathPlanningWithLidar 的 scan.
+                start_pos (ndarray): (N, 2) 起点.
+                end_pos (ndarray): (N, 2) 终点.
+            Returns:
+                list[ndarray]: N 条路径, 与 plan_path 的返回一致.
+        """
+        start_pos = np.asarray(start_pos, dtype=np.float64).reshape(-1, 2)
+        end_pos = np.broadcast_to(np.asarray(end_pos, dtype=np.float64), start_pos.shape)
+        num_episodes = len(start_pos)
+        paths = np.empty((num_episodes, max_steps + 1, 2))
+        paths[:, 0] = start_pos
+        lengths = np.ones(num_episodes, dtype=np.int64)
+
+        self.model.eval()
+        episodes = np.arange(num_episodes)
+        current_pos = start_pos.copy()
+        for step in range(1, max_steps + 1):
+            if len(episodes) == 0:
+                break
+            lidar_scans = lidar_scan_func(current_pos, episodes)
+            current_pos = current_pos + self.predict_batch(lidar_scans, current_pos)
+            paths[episodes, step] = current_pos
+            lengths[episodes] = step + 1
+            running = np.linalg.norm(current_pos - end_pos[episodes], axis=1) >= threshold
+            episodes = episodes[running]
+            current_pos = current_pos[running]
+        return [paths[k, :lengths[k]] for k in range(num_episodes)]
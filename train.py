@@ -7,7 +7,10 @@
 
 # load my env
 from plan_planning_env import Map, PathPlanningWithLidar, RRT, WaveFront
+from plan_planning_env.dataset import DEFAULT_MAP_SIZE, list_sources, load_maps
+from plan_planning_env.render import LidarRenderer
 
+import argparse
 import numpy as np
 import os
 from matplotlib.patches import Polygon
@@ -16,30 +19,51 @@ import pickle
 import random
 
 if __name__ == "__main__":
-    # path datasets
-    trains_path = './dataset/trains'
-    pkls = [ f.path for f in os.scandir(trains_path) if f.name.endswith('.pkl') ]
+    parser = argparse.ArgumentParser(description="replay planned paths with the lidar env")
+    parser.add_argument("--trains-path", default="./dataset/trains", help="directory of pkl maps or .npz datasets")
+    parser.add_argument("--output", default=None,
+                        help="render offscreen into this directory instead of a window, one video/frame dir per run")
+    parser.add_argument("--format", default="mp4", help="'png'/'jpg' for image sequences, otherwise a video suffix")
+    parser.add_argument("--frame-stride", type=int, default=1, help="render every n-th step")
+    parser.add_argument("--fps", type=int, default=20)
+    args = parser.parse_args()
+
+    # path datasets, pickled maps or columnar .npz datasets
+    trains_path = args.trains_path
+    files = list_sources(trains_path)
 
     
-    for pkl in pkls:
+    for file in files:
         try:
-            with open(pkl, 'rb') as f:
-                data = pickle.load(f)
+            for name, data in load_maps(file):
                 obstacles = data.get("obstacles")
                 runs = data.get("runs")
-                
-                # define MAP
-                custom_map = Map(obstacles, start, end)
-                for run in runs:
+                # 同一地图的回放共用渲染器, 障碍物图层只绘制一次
+                renderer = None
+                if args.output is not None:
+                    image_format = args.format if args.format in ("png", "jpg") else "png"
+                    renderer = LidarRenderer(frame_stride=args.frame_stride, fps=args.fps, image_format=image_format,
+                                             headless=True)
+
+                for i, run in enumerate(runs):
                     start = run.get("start")
                     end = run.get("end")
-                    env = PathPlanningWithLidar(custom_map)
+                    # define MAP
+                    custom_map = Map(obstacles, start, end, map_size=data.get("map_size", DEFAULT_MAP_SIZE))
+                    env = PathPlanningWithLidar(custom_map, renderer=renderer)
                     env.path = run.get("path")
+                    if renderer is not None:
+                        stem = os.path.join(args.output, f"{os.path.splitext(name)[0]}_{i}")
+                        renderer.start_output(stem if args.format in ("png", "jpg") else f"{stem}.{args.format}")
                 
                     done = False
                     while not done:
                         done, obs = env.step()
                         env.render()
                     env.close()
+                    if renderer is not None:
+                        renderer.finish()
+                if renderer is not None:
+                    renderer.close()
         except Exception as e:
-            print(f"load {pkl} error: {e}")
\ No newline at end of file
+            print(f"load {file} error: {e}")